@@ -1,20 +1,87 @@
 import base64
+import binascii
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from posts.fields import validate_image_pixels
 from rest_framework.serializers import ImageField
 
+# Длина куска base64, декодируемого за раз; кратна 4
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def decode_base64_file(data, start, name, content_type):
+    """
+    Декодирует base64 из строки data, начиная с позиции start, кусками
+    по BASE64_CHUNK_SIZE, пропуская пробельные символы (base64 с переносом
+    строк), в загруженный файл: до FILE_UPLOAD_MAX_MEMORY_SIZE
+    байт в памяти, больше - во временный файл на диске, который
+    хранилище потом перемещает без копирования.
+    """
+    if (len(data) - start) * 3 // 4 > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        file = TemporaryUploadedFile(name, content_type, 0, None)
+    else:
+        file = InMemoryUploadedFile(
+            BytesIO(), None, name, content_type, 0, None
+        )
+    rest = ""
+    try:
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            end = position + BASE64_CHUNK_SIZE
+            # переносы строк и пробелы отбрасываются, а неполная
+            # четверка символов переходит в следующий кусок
+            chunk = rest + "".join(data[position:end].split())
+            size = len(chunk) - len(chunk) % 4
+            file.write(base64.b64decode(chunk[:size], validate=True))
+            rest = chunk[size:]
+        if rest:
+            raise binascii.Error("Incorrect padding")
+    except (binascii.Error, ValueError):
+        file.close()
+        raise
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
 
 class Base64ImageField(ImageField):
     """
     Кастомный тип поля ImageField,который принимает
     закодированное в формате base64 изображение,
     декодирует и сохраняет его на сервере.
+    Принимает и обычный файл из запроса multipart/form-data.
+    Файлы больше IMAGE_UPLOAD_MAX_SIZE отклоняются до декодирования,
+    картинки больше IMAGE_MAX_PIXELS - по заголовку файла.
     """
 
+    default_error_messages = {
+        **ImageField.default_error_messages,
+        "too_large": "Файл больше допустимых {max_size} байт.",
+    }
+    default_validators = [validate_image_pixels]
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
-
+            start = data.find(";base64,")
+            if start < 0:
+                self.fail("invalid_image")
+            content_type = data[:start].removeprefix("data:")
+            start += len(";base64,")
+            self.check_size((len(data) - start) * 3 // 4)
+            ext = content_type.split("/")[-1]
+            try:
+                data = decode_base64_file(
+                    data, start, "temp." + ext, content_type
+                )
+            except (binascii.Error, ValueError):
+                self.fail("invalid_image")
+        self.check_size(getattr(data, "size", 0))
         return super().to_internal_value(data)
+
+    def check_size(self, size):
+        if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail("too_large", max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
@@ -0,0 +1,71 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class LegacyLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Прежняя пагинация по offset; без limit возвращает страницу
+    размера PAGE_SIZE, а не все объекты.
+    """
+
+    default_limit = settings.PAGE_SIZE
+    max_limit = 100
+
+
+class CursorOrLimitOffsetPagination(CursorPagination):
+    """
+    Курсорная пагинация без подсчета общего количества объектов.
+    Если в запросе передан параметр offset, используется прежняя
+    пагинация LegacyLimitOffsetPagination.
+    """
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = 100
+    legacy_pagination_class = LegacyLimitOffsetPagination
+
+    def get_legacy_paginator(self, request):
+        offset_query_param = self.legacy_pagination_class.offset_query_param
+        if offset_query_param in request.query_params:
+            return self.legacy_pagination_class()
+        return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.legacy_paginator = self.get_legacy_paginator(request)
+        if self.legacy_paginator is not None:
+            return self.legacy_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.legacy_paginator is not None:
+            return self.legacy_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class PostPagination(CursorOrLimitOffsetPagination):
+    """Пагинация постов."""
+
+    ordering = ("-pub_date", "-id")
+
+
+class CommentPagination(CursorOrLimitOffsetPagination):
+    """Пагинация комментариев."""
+
+    ordering = ("-created", "-id")
+
+
+class GroupPagination(CursorOrLimitOffsetPagination):
+    """Пагинация групп."""
+
+    ordering = ("id",)
+
+
+class SearchPagination(CursorPagination):
+    """Курсорная пагинация результатов поиска по релевантности."""
+
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ("-rank", "-id")
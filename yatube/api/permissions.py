@@ -12,3 +12,10 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
             request.method in permissions.SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class IsSelfOrAdmin(permissions.IsAuthenticated):
+    """Доступ к данным пользователя только ему самому и администратору."""
+
+    def has_object_permission(self, request, view, obj):
+        return obj == request.user or request.user.is_staff
@@ -1,4 +1,8 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from djoser.serializers import UserSerializer
 from posts.models import Comment, Group, Post
 from rest_framework import serializers
@@ -30,8 +34,18 @@ class CustomUserSerializer(UserSerializer):
     """Сериализатор для пользователя."""
 
     is_subscribed = serializers.BooleanField(read_only=True)
-    subscriptions_count = serializers.IntegerField(read_only=True)
-    subscribers_count = serializers.IntegerField(read_only=True)
+    subscriptions_count = serializers.IntegerField(
+        source="stats.subscriptions_count", read_only=True
+    )
+    subscribers_count = serializers.IntegerField(
+        source="stats.subscribers_count", read_only=True
+    )
+    posts_count = serializers.IntegerField(
+        source="stats.posts_count", read_only=True
+    )
+    views_count = serializers.IntegerField(
+        source="stats.views_count", read_only=True
+    )
 
     class Meta:
         model = User
@@ -46,6 +60,8 @@ class CustomUserSerializer(UserSerializer):
             "is_subscribed",
             "subscribers_count",
             "subscriptions_count",
+            "posts_count",
+            "views_count",
         )
 
 
@@ -90,7 +106,6 @@ class PostSerializer(serializers.ModelSerializer):
 
     author = AuthorOfPostSerializer(read_only=True)
     group = GroupOfPostSerializer(read_only=True)
-    views_count = serializers.IntegerField()
 
     class Meta:
         fields = (
@@ -100,12 +115,40 @@ class PostSerializer(serializers.ModelSerializer):
             "author",
             "pub_date",
             "image",
+            "image_status",
             "group",
             "views_count",
+            "comments_count",
         )
         model = Post
 
 
+class PostSearchSerializer(PostSerializer):
+    """Сериализатор результатов поиска постов."""
+
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+    bodyline = serializers.CharField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ("rank", "headline", "bodyline")
+
+
+class SearchParamsSerializer(serializers.Serializer):
+    """Сериализатор параметров поиска постов."""
+
+    q = serializers.CharField(max_length=200)
+    group = serializers.IntegerField(min_value=1, required=False)
+    author = serializers.IntegerField(min_value=1, required=False)
+
+
+class AutocompleteParamsSerializer(serializers.Serializer):
+    """Сериализатор параметров подсказок поиска."""
+
+    q = serializers.CharField(min_length=2, max_length=50)
+    limit = serializers.IntegerField(min_value=1, max_value=20, required=False)
+
+
 class PostCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновление постов."""
 
@@ -120,6 +163,15 @@ class PostCreateSerializer(serializers.ModelSerializer):
         )
         model = Post
 
+    def save(self, **kwargs):
+        # временный файл картинки из base64 удаляется сразу после записи
+        # в хранилище, не дожидаясь сборщика мусора
+        try:
+            return super().save(**kwargs)
+        finally:
+            if image := self.validated_data.get("image"):
+                image.close()
+
 
 class PostDetailSerializer(serializers.ModelSerializer):
     """Сериализатор для детального просмотра постов."""
@@ -127,7 +179,6 @@ class PostDetailSerializer(serializers.ModelSerializer):
     author = AuthorOfPostSerializer(read_only=True)
     group = GroupOfPostSerializer(read_only=True)
     comments = CommentReadSerializer(many=True, read_only=True)
-    views_count = serializers.IntegerField()
 
     class Meta:
         fields = (
@@ -137,8 +188,10 @@ class PostDetailSerializer(serializers.ModelSerializer):
             "author",
             "pub_date",
             "image",
+            "image_status",
             "group",
             "views_count",
+            "comments_count",
             "comments",
         )
         model = Post
@@ -166,3 +219,40 @@ class SubscribeSerializer(serializers.ModelSerializer):
             "birth_date",
             "avatar",
         )
+
+
+class StatsPeriodSerializer(serializers.Serializer):
+    """Сериализатор периода статистики просмотров."""
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        end = data.get("end") or timezone.localdate()
+        start = data.get("start") or end - timedelta(
+            days=settings.STATS_DEFAULT_DAYS - 1
+        )
+        if start > end:
+            raise serializers.ValidationError(
+                "Начало периода не может быть позже его окончания."
+            )
+        if (end - start).days >= settings.STATS_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Период не может быть длиннее {settings.STATS_MAX_DAYS} дней."
+            )
+        return {"start": start, "end": end}
+
+
+class DailyViewsSerializer(serializers.Serializer):
+    """Сериализатор просмотров за день."""
+
+    day = serializers.DateField()
+    views = serializers.IntegerField()
+
+
+class PostViewsSerializer(serializers.Serializer):
+    """Сериализатор просмотров поста за период."""
+
+    id = serializers.IntegerField(source="post_id")
+    title = serializers.CharField(source="post__title")
+    views = serializers.IntegerField()
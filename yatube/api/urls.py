@@ -1,7 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import CommentViewSet, CustomUserViewSet, GroupViewSet, PostViewSet
+from .views import (
+    AutocompleteViewSet,
+    CommentViewSet,
+    CustomUserViewSet,
+    GroupViewSet,
+    PostViewSet,
+)
 
 router = DefaultRouter()
 router.register(r"users", CustomUserViewSet, basename="users")
@@ -10,6 +16,7 @@ router.register(
 )
 router.register(r"posts", PostViewSet, basename="posts")
 router.register(r"groups", GroupViewSet, basename="groups")
+router.register(r"autocomplete", AutocompleteViewSet, basename="autocomplete")
 
 
 urlpatterns = [
@@ -1,35 +1,63 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Sum
 from django.shortcuts import get_list_or_404, get_object_or_404
 from djoser.views import UserViewSet
-from posts.models import Comment, Group, Post
+from posts.hyperloglog import count_author_unique_views
+from posts.models import (
+    AuthorDailyViews,
+    Comment,
+    Group,
+    Post,
+    PostDailyViews,
+)
+from posts.search import add_headlines, autocomplete, search_posts
 from posts.signals import post_view_signal
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.mixins import (
     CreateModelMixin,
     DestroyModelMixin,
+    ListModelMixin,
     RetrieveModelMixin,
     UpdateModelMixin,
 )
-from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.permissions import SAFE_METHODS
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    AllowAny,
+    IsAuthenticated,
+)
 from rest_framework.response import Response
 from rest_framework.viewsets import (
     GenericViewSet,
     ModelViewSet,
     ReadOnlyModelViewSet,
+    ViewSet,
 )
 from users.models import Follow
 
-from .permissions import IsAuthorOrReadOnly
+from .pagination import (
+    CommentPagination,
+    GroupPagination,
+    PostPagination,
+    SearchPagination,
+)
+from .permissions import IsAuthorOrReadOnly, IsSelfOrAdmin
 from .serializers import (
+    AutocompleteParamsSerializer,
     CommentCreateSerializer,
     CommentReadSerializer,
     CustomUserSerializer,
+    DailyViewsSerializer,
     GroupSerializer,
     PostCreateSerializer,
     PostDetailSerializer,
+    PostSearchSerializer,
     PostSerializer,
+    PostViewsSerializer,
+    SearchParamsSerializer,
+    StatsPeriodSerializer,
     SubscribeSerializer,
 )
 
@@ -39,10 +67,10 @@ User = get_user_model()
 class PostViewSet(ModelViewSet):
     """Вьюсет для постов."""
 
-    queryset = Post.objects.get_views_count().select_related("author", "group")
+    queryset = Post.objects.select_related("author", "group")
     serializer_class = PostSerializer
     permission_classes = [IsAuthorOrReadOnly]
-    pagination_class = LimitOffsetPagination
+    pagination_class = PostPagination
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -54,19 +82,72 @@ class PostViewSet(ModelViewSet):
             return PostDetailSerializer
         return super().get_serializer_class()
 
+    @action(
+        detail=False,
+        serializer_class=PostSearchSerializer,
+        pagination_class=SearchPagination,
+    )
+    def search(self, request):
+        """
+        Полнотекстовый поиск постов по параметру q
+        с необязательными фильтрами group и author (id).
+        """
+        params = SearchParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data.pop("q")
+        queryset = search_posts(
+            query, self.get_queryset(), **params.validated_data
+        )
+        page = add_headlines(self.paginate_queryset(queryset), query)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        parser_classes=[MultiPartParser],
+        permission_classes=[IsAuthenticated],
+    )
+    def upload(self, request):
+        """
+        Создание поста с картинкой из запроса multipart/form-data:
+        файл пишется на диск по частям, без кодирования в base64.
+        """
+        return self.create(request)
+
     def get_object(self):
         obj = super().get_object()
-        # сигнал создания записи просмотра определенного поста
-        post_view_signal.send(sender=Post, instance=obj, request=self.request)
+        if self.action == "retrieve":
+            # сигнал учета просмотра определенного поста
+            post_view_signal.send(
+                sender=Post, instance=obj, request=self.request
+            )
         return obj
 
 
+class AutocompleteViewSet(ViewSet):
+    """Вьюсет подсказок поиска по префиксу."""
+
+    permission_classes = [AllowAny]
+
+    def list(self, request):
+        """Заголовки постов, имена пользователей и названия групп."""
+        params = AutocompleteParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(
+            autocomplete(
+                params.validated_data["q"], params.validated_data.get("limit")
+            )
+        )
+
+
 class GroupViewSet(ReadOnlyModelViewSet):
     """Вьюсет для групп."""
 
     queryset = Group.objects.all()
     serializer_class = GroupSerializer
     permission_classes = [IsAuthorOrReadOnly]
+    pagination_class = GroupPagination
 
 
 class CreateUpdateRetrieveMixin(
@@ -78,21 +159,22 @@ class CreateUpdateRetrieveMixin(
 ): ...
 
 
-class CommentViewSet(CreateUpdateRetrieveMixin):
+class CommentViewSet(ListModelMixin, CreateUpdateRetrieveMixin):
     """Вьюсет для чтения комментариев."""
 
     queryset = Comment.objects.all()
     serializer_class = CommentReadSerializer
     permission_classes = [IsAuthorOrReadOnly]
+    pagination_class = CommentPagination
 
     def get_serializer_class(self):
-        if self.action == "retrieve":
+        if self.action in ("list", "retrieve"):
             return super().get_serializer_class()
         return CommentCreateSerializer
 
     def get_queryset(self):
         post = get_object_or_404(Post, pk=self.kwargs.get("post_id"))
-        return post.comments.all()
+        return post.comments.select_related("author")
 
     def perform_create(self, serializer):
         post = get_object_or_404(Post, pk=self.kwargs.get("post_id"))
@@ -107,9 +189,7 @@ class CustomUserViewSet(UserViewSet):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        queryset = queryset.get_is_subscribed()
-        queryset = queryset.get_subscribers_count()
-        queryset = queryset.get_subscriptions_count()
+        queryset = queryset.get_is_subscribed().select_related("stats")
         return queryset
 
     @action(methods=["post", "delete"], detail=True)
@@ -145,3 +225,42 @@ class CustomUserViewSet(UserViewSet):
         )
         serializers = SubscribeSerializer(subscriptions, many=True)
         return Response(serializers.data)
+
+    @action(methods=["GET"], detail=True, permission_classes=[IsSelfOrAdmin])
+    def stats(self, request, id):
+        """
+        Просмотры постов автора по дням из сводных таблиц;
+        с VIEWS_HLL - и уникальные посетители за период по скетчам.
+        """
+        author = self.get_object()
+        period = StatsPeriodSerializer(data=request.query_params)
+        period.is_valid(raise_exception=True)
+        start = period.validated_data["start"]
+        end = period.validated_data["end"]
+        days = (
+            AuthorDailyViews.objects.filter(
+                author=author, day__range=(start, end)
+            )
+            .order_by("day")
+            .values("day", "views")
+        )
+        top_posts = (
+            PostDailyViews.objects.filter(
+                post__author=author, day__range=(start, end)
+            )
+            .values("post_id", "post__title")
+            .annotate(views=Sum("views"))
+            .order_by("-views", "-post_id")[: settings.STATS_TOP_POSTS]
+        )
+        data = {
+            "start": start,
+            "end": end,
+            "total": sum(day["views"] for day in days),
+            "days": DailyViewsSerializer(days, many=True).data,
+            "top_posts": PostViewsSerializer(top_posts, many=True).data,
+        }
+        if settings.VIEWS_HLL:
+            data["unique_visitors"] = count_author_unique_views(
+                author.id, start, end
+            )
+        return Response(data)
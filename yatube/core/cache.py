@@ -0,0 +1,51 @@
+import pickle
+import zlib
+
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache, RedisSerializer
+
+
+class CompressedRedisSerializer(RedisSerializer):
+    """
+    Сериализатор кеша Redis, сжимающий крупные значения zlib.
+    Целые числа сохраняются как есть, чтобы работали incr и decr.
+    """
+
+    marker = b"z"
+    min_length = 1024
+
+    def dumps(self, obj):
+        data = super().dumps(obj)
+        if isinstance(data, bytes) and len(data) >= self.min_length:
+            return self.marker + zlib.compress(data)
+        return data
+
+    def loads(self, data):
+        if data[:1] == self.marker:
+            return pickle.loads(zlib.decompress(data[1:]))
+        return super().loads(data)
+
+
+def get_redis_client(alias="default"):
+    """
+    Клиент Redis, в котором хранится кеш alias;
+    None, если кеш хранится не в Redis.
+    """
+    backend = caches[alias]
+    if not isinstance(backend, RedisCache):
+        return None
+    return _get_backend_client(backend)
+
+
+def _get_backend_client(backend):
+    """
+    Клиент redis-py бэкенда RedisCache. Публичного доступа к нему
+    у Django нет: клиент берется из внутреннего RedisCacheClient
+    (атрибут _cache, Django 4.0+). Если внутреннее устройство
+    бэкенда изменится, возвращается None, как для кеша не в Redis.
+    """
+    cache_client = getattr(backend, "_cache", None)
+    get_client = getattr(cache_client, "get_client", None)
+    if get_client is None:
+        return None
+    return get_client(write=True)
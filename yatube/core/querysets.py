@@ -0,0 +1,23 @@
+from collections import defaultdict
+
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+class CounterQuerySetMixin:
+    """Миксин QuerySet для изменения хранимых счетчиков без гонок."""
+
+    def increment(self, field_name, amounts):
+        """
+        Увеличивает счетчик field_name объектов на amounts[pk];
+        объекты с одинаковым приращением обновляются одним запросом,
+        счетчик не опускается ниже нуля.
+        """
+        pks_by_amount = defaultdict(list)
+        for pk, amount in amounts.items():
+            if amount:
+                pks_by_amount[amount].append(pk)
+        for amount, pks in pks_by_amount.items():
+            self.filter(pk__in=pks).update(
+                **{field_name: Greatest(F(field_name) + amount, 0)}
+            )
@@ -15,8 +15,8 @@ def addclass(field, css):
 def param_replace(context, **kwargs):
     """
     Функция для исправления совместимости фильтра и паджинатора;
-    Извлекает из kwargs номера страниц и добавляет их в контекст
-    параллельно удаляя старые данные.
+    Извлекает из kwargs номера страниц или курсоры и добавляет их
+    в контекст параллельно удаляя старые данные.
     """
 
     d = context["request"].GET.copy()
@@ -51,12 +51,28 @@ def time_since_post(created_at):
 
 @register.inclusion_tag("tags/group_list.html", takes_context=True)
 def get_post_of_group(context):
+    """
+    Виджет групп; на странице поиска - группы с найденными постами,
+    их количеством и ссылкой на поиск внутри группы.
+    """
     query = Group.objects.all()
     path = context.request.path.strip("/").split("/")
     current_group = None
     if path[0] == "group":
         current_group = path[-1]
+    group_list = set_get_cache(query, "post_of_group_tag", 900)
+    facets = context.get("group_facets")
+    if facets is not None:
+        current_group = context.request.GET.get("group")
+        group_list = sorted(
+            (group for group in group_list if group.pk in facets),
+            key=lambda group: -facets[group.pk],
+        )
+        for group in group_list:
+            group.search_count = facets[group.pk]
     return {
-        "group_list": set_get_cache(query, "post_of_group_tag", 900),
+        "group_list": group_list,
         "current_group": current_group,
+        "search_facets": facets is not None,
+        "request": context.request,
     }
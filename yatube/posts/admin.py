@@ -1,13 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import Sum
+from django.utils import timezone
 
-from .models import Comment, Group, Post, ViewPost
+from .models import (
+    AuthorDailyViews,
+    Comment,
+    Group,
+    Post,
+    PostDailyViews,
+    ViewPost,
+)
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     """Административная панель для модели Post."""
 
-    list_display = ("title", "pub_date", "author", "group", "get_views_count")
+    list_display = (
+        "title",
+        "pub_date",
+        "author",
+        "group",
+        "views_count",
+        "comments_count",
+    )
     list_editable = ("group", "author")
     search_fields = ("title",)
     list_filter = ("pub_date",)
@@ -15,16 +34,6 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = "-пусто-"
     list_select_related = ("author", "group")
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.get_views_count()
-        return queryset
-
-    @admin.display(description="Кол-во просмотров")
-    def get_views_count(self, obj):
-        """Количество просмотров поста."""
-        return obj.views_count
-
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -47,3 +56,47 @@ class GroupAdmin(admin.ModelAdmin):
 
 admin.site.register(Comment)
 admin.site.register(ViewPost)
+
+
+@admin.register(PostDailyViews)
+class PostDailyViewsAdmin(admin.ModelAdmin):
+    """Административная панель для просмотров постов по дням."""
+
+    list_display = ("post", "day", "views")
+    list_filter = ("day",)
+    list_select_related = ("post",)
+    date_hierarchy = "day"
+
+
+@admin.register(AuthorDailyViews)
+class AuthorDailyViewsAdmin(admin.ModelAdmin):
+    """
+    Административная панель для просмотров авторов по дням
+    с графиком просмотров за последние STATS_DEFAULT_DAYS дней.
+    """
+
+    list_display = ("author", "day", "views")
+    list_filter = ("day",)
+    list_select_related = ("author",)
+    search_fields = ("author__username",)
+    date_hierarchy = "day"
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        if not hasattr(response, "context_data"):
+            return response
+        start = timezone.localdate() - timedelta(
+            days=settings.STATS_DEFAULT_DAYS - 1
+        )
+        queryset = response.context_data["cl"].queryset
+        days = list(
+            queryset.filter(day__gte=start)
+            .order_by("day")
+            .values("day")
+            .annotate(total=Sum("views"))
+        )
+        peak = max((day["total"] for day in days), default=0)
+        for day in days:
+            day["height"] = round(day["total"] * 100 / peak) if peak else 0
+        response.context_data["views_chart"] = days
+        return response
@@ -1,32 +1,110 @@
-import io
 import os
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
 from django.db import models
 from django.db.models.fields.files import ImageFieldFile
-from PIL import Image
 
 
-class WEBPFieldFile(ImageFieldFile):
+class ImageStatus(models.TextChoices):
+    """Состояние конвертации картинки в WEBP."""
+
+    READY = "ready", "Готова"
+    PENDING = "pending", "Конвертируется"
+    FAILED = "failed", "Ошибка конвертации"
+
+
+def validate_image_pixels(file):
+    """
+    Отклоняет картинку больше IMAGE_MAX_PIXELS пикселей; размер
+    читается из заголовка файла, без декодирования картинки.
+    Уже сохраненные файлы не проверяются.
+    """
+    if getattr(file, "_committed", False):
+        return
+    width, height = get_image_dimensions(file)
+    if width and height and width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f"Изображение {width}x{height} слишком большое: допустимо "
+            f"не более {settings.IMAGE_MAX_PIXELS} пикселей."
+        )
+
+
+class RenditionsFieldFile(ImageFieldFile):
+    """
+    Файл картинки, при сохранении нового файла которого сбрасываются
+    миниатюры в поле renditions_field модели.
+    """
+
+    def save(self, name, content, save=True):
+        if self.field.renditions_field is not None:
+            setattr(self.instance, self.field.renditions_field, {})
+        super().save(name, content, save)
+
+
+class RenditionsImageField(models.ImageField):
     """
-    Класс наследник от ImageFieldFile, который производит
-    сохранение файла с автоматической конвертацией в WEBP формат.
+    Класс наследник от ImageField, миниатюры которого из настройки
+    IMAGE_RENDITIONS хранятся в JSON-поле renditions_field модели.
+    """
+
+    attr_class = RenditionsFieldFile
+    default_validators = [validate_image_pixels]
+
+    def __init__(self, *args, renditions_field=None, **kwargs):
+        self.renditions_field = renditions_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.renditions_field is not None:
+            kwargs["renditions_field"] = self.renditions_field
+        return name, path, args, kwargs
+
+
+class WEBPFieldFile(RenditionsFieldFile):
+    """
+    Класс наследник от ImageFieldFile, который сохраняет загруженный
+    файл как есть и отмечает его для конвертации в WEBP формат;
+    WEBP-картинки больше IMAGE_MAX_EDGE тоже конвертируются.
+    Конвертацию выполняет задача Celery process_image после сохранения
+    объекта, до ее окончания отображается исходная картинка.
     """
 
     def save(self, name, content, save=True):
-        content.file.seek(0)
-        image = Image.open(content.file)
-        image_bytes = io.BytesIO()
-        image.save(fp=image_bytes, format="WEBP")
-        name = f"{os.path.splitext(name)[0]}.webp"
-        image_content_file = ContentFile(content=image_bytes.getvalue())
-        super().save(name, image_content_file, save)
+        status_field = self.field.status_field
+        if status_field is not None:
+            extension = os.path.splitext(name)[1].lower()
+            width, height = get_image_dimensions(content)
+            ready = (
+                extension == ".webp"
+                and width
+                and max(width, height) <= settings.IMAGE_MAX_EDGE
+            )
+            setattr(
+                self.instance,
+                status_field,
+                ImageStatus.READY if ready else ImageStatus.PENDING,
+            )
+        super().save(name, content, save)
 
 
-class WEBPField(models.ImageField):
+class WEBPField(RenditionsImageField):
     """
-    Класс наследник от ImageField,
+    Класс наследник от RenditionsImageField,
     который использует WEBPFieldFile вместо ImageFieldFile.
+    В поле status_field модели хранится состояние конвертации.
     """
 
     attr_class = WEBPFieldFile
+
+    def __init__(self, *args, status_field=None, **kwargs):
+        self.status_field = status_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.status_field is not None:
+            kwargs["status_field"] = self.status_field
+        return name, path, args, kwargs
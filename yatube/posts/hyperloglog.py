@@ -0,0 +1,198 @@
+import datetime
+import hashlib
+import math
+
+from core.cache import get_redis_client
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import ViewSketch
+
+
+class HyperLogLog:
+    """
+    Скетч HyperLogLog для приблизительного подсчета уникальных значений.
+    Занимает 2 ** precision байт независимо от числа значений;
+    скетчи объединяются поэлементным максимумом регистров.
+    Используется вместо PFADD/PFCOUNT Redis, когда скетчи хранятся
+    в таблице ViewSketch.
+    """
+
+    def __init__(self, precision=14, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers or self.size)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        hashed = int.from_bytes(digest, "big")
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = (
+            alpha
+            * self.size**2
+            / sum(2.0**-register for register in self.registers)
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def __bytes__(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data, precision=14):
+        return cls(precision, data)
+
+
+def get_post_views_key(post_id):
+    return f"hll_post_views_{post_id}"
+
+
+def get_author_views_key(author_id, day):
+    return f"hll_author_views_{author_id}_{day.isoformat()}"
+
+
+def get_sketch_cache():
+    """
+    Кеш скетчей в отдельном Redis (VIEWS_REDIS_URL), который не делит
+    память с основным кешем и не вытесняет ключи; None - скетчи
+    хранятся в таблице ViewSketch.
+    """
+    if "views" not in settings.CACHES:
+        return None
+    sketch_cache = caches["views"]
+    client = get_redis_client("views")
+    return None if client is None else (sketch_cache, client)
+
+
+def load_sketches(keys):
+    return {
+        key: HyperLogLog.from_bytes(registers)
+        for key, registers in ViewSketch.objects.filter(
+            key__in=keys
+        ).values_list("key", "registers")
+    }
+
+
+def add_unique_views(members_by_key, timeout=None):
+    """
+    Добавляет посетителей members_by_key[key] в скетчи key; возвращает,
+    на сколько выросла оценка уникальных посетителей каждого скетча.
+    """
+    keys = list(members_by_key)
+    redis = get_sketch_cache()
+    if redis is not None:
+        sketch_cache, client = redis
+        redis_keys = [sketch_cache.make_key(key) for key in keys]
+        pipeline = client.pipeline()
+        for redis_key in redis_keys:
+            pipeline.pfcount(redis_key)
+        for key, redis_key in zip(keys, redis_keys):
+            pipeline.pfadd(redis_key, *members_by_key[key])
+            if timeout is not None:
+                pipeline.expire(redis_key, timeout)
+        for redis_key in redis_keys:
+            pipeline.pfcount(redis_key)
+        counts = pipeline.execute()
+        size = len(keys)
+        before, after = counts[:size], counts[-size:]
+        return {
+            key: max(new - old, 0)
+            for key, old, new in zip(keys, before, after)
+        }
+    sketches = load_sketches(keys)
+    expires_at = None
+    if timeout is not None:
+        expires_at = timezone.now() + datetime.timedelta(seconds=timeout)
+    deltas, changed = {}, []
+    for key in keys:
+        sketch = sketches.get(key) or HyperLogLog()
+        before = sketch.count()
+        if not any([sketch.add(member) for member in members_by_key[key]]):
+            deltas[key] = 0
+            continue
+        deltas[key] = max(sketch.count() - before, 0)
+        changed.append(
+            ViewSketch(key=key, registers=bytes(sketch), expires_at=expires_at)
+        )
+    ViewSketch.objects.bulk_create(
+        changed,
+        update_conflicts=True,
+        unique_fields=("key",),
+        update_fields=("registers", "expires_at"),
+    )
+    return deltas
+
+
+def count_unique_views(*keys):
+    """
+    Количество уникальных посетителей в объединении скетчей keys.
+    Объединение занимает память одного скетча при любом числе ключей.
+    """
+    redis = get_sketch_cache()
+    if redis is not None:
+        sketch_cache, client = redis
+        return client.pfcount(*(sketch_cache.make_key(key) for key in keys))
+    sketch = HyperLogLog()
+    for registers in (
+        ViewSketch.objects.filter(key__in=keys)
+        .values_list("registers", flat=True)
+        .iterator()
+    ):
+        sketch.merge(HyperLogLog.from_bytes(registers))
+    return sketch.count()
+
+
+def record_unique_views(views, post_authors, day=None):
+    """
+    Учитывает просмотры (post_id, user_id, ip) в скетчах поста
+    и автора за день; возвращает прирост уникальных просмотров постов,
+    который прибавляется к их счетчикам.
+    """
+    day = day or timezone.localdate()
+    members_by_post, members_by_author = {}, {}
+    for post_id, user_id, ip_address in views:
+        if post_id not in post_authors:
+            continue
+        member = f"u{user_id}" if user_id else f"ip{ip_address}"
+        members_by_post.setdefault(get_post_views_key(post_id), set()).add(
+            member
+        )
+        members_by_author.setdefault(
+            get_author_views_key(post_authors[post_id], day), set()
+        ).add(member)
+    deltas = add_unique_views(members_by_post)
+    add_unique_views(
+        members_by_author, settings.VIEWS_HLL_RETENTION_DAYS * 24 * 60 * 60
+    )
+    return {
+        post_id: deltas[get_post_views_key(post_id)]
+        for post_id in {post_id for post_id, _, _ in views}
+        & post_authors.keys()
+    }
+
+
+def count_author_unique_views(author_id, start, end):
+    """Уникальные посетители постов автора за дни с start по end."""
+    days = (end - start).days + 1
+    return count_unique_views(
+        *(
+            get_author_views_key(author_id, start + datetime.timedelta(n))
+            for n in range(days)
+        )
+    )
@@ -0,0 +1,173 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import ExifTags, Image
+from sorl.thumbnail import get_thumbnail
+
+RENDITION_OPTIONS = {"crop": "center", "upscale": True}
+
+# Поворот картинки по тегу Orientation из EXIF, как в ImageOps.exif_transpose
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def open_image(source):
+    """
+    Открывает картинку, прочитав только заголовок файла; картинки
+    больше IMAGE_MAX_PIXELS пикселей отклоняются до декодирования.
+    """
+    image = Image.open(source)
+    if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+        raise Image.DecompressionBombError(
+            f"Image size {image.width}x{image.height} exceeds "
+            f"IMAGE_MAX_PIXELS={settings.IMAGE_MAX_PIXELS}"
+        )
+    return image
+
+
+def fit_size(size, max_edge):
+    """Размер size, уменьшенный до длинной стороны max_edge."""
+    width, height = size
+    scale = max_edge / max(width, height)
+    if scale >= 1:
+        return size
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def buffer_size(image):
+    """
+    Объем памяти пикселей декодированной картинки в байтах:
+    Pillow хранит пиксель многоканальной картинки в 4 байтах.
+    """
+    depth = 1 if image.mode in ("1", "L", "P") else 4
+    return image.width * image.height * depth
+
+
+def replace_image(image, result, peak):
+    """
+    Заменяет картинку результатом ее обработки и освобождает ее пиксели;
+    пока строится результат, в памяти находятся обе картинки.
+    """
+    peak = max(peak, buffer_size(image) + buffer_size(result))
+    image.close()
+    return result, peak
+
+
+def decode_master(image):
+    """
+    Декодирует открытую картинку в размере не больше IMAGE_MAX_EDGE
+    и возвращает ее вместе с оценкой пикового объема памяти пикселей.
+    JPEG сразу декодируется уменьшенным в 2-8 раз (draft), остальные
+    форматы декодируются в исходном размере, поэтому картинка, которая
+    и после draft больше IMAGE_MAX_DECODE_PIXELS, отклоняется до
+    декодирования. Перед точным масштабированием картинка уменьшается
+    в целое число раз методом reduce. Поворот из EXIF применяется
+    к результату.
+    """
+    size = fit_size(image.size, settings.IMAGE_MAX_EDGE)
+    orientation = image.getexif().get(ExifTags.Base.Orientation)
+    if size != image.size:
+        image.draft(None, size)
+    if image.width * image.height > settings.IMAGE_MAX_DECODE_PIXELS:
+        raise Image.DecompressionBombError(
+            f"{image.format} image {image.width}x{image.height} exceeds "
+            f"IMAGE_MAX_DECODE_PIXELS={settings.IMAGE_MAX_DECODE_PIXELS}"
+        )
+    image.load()
+    peak = buffer_size(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image, peak = replace_image(
+            image,
+            image.convert("RGBA" if image.has_transparency_data else "RGB"),
+            peak,
+        )
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor > 1:
+        image, peak = replace_image(image, image.reduce(factor), peak)
+    if image.size != size:
+        image, peak = replace_image(
+            image, image.resize(size, Image.Resampling.LANCZOS), peak
+        )
+    if orientation in ORIENTATION_TRANSPOSE:
+        image, peak = replace_image(
+            image, image.transpose(ORIENTATION_TRANSPOSE[orientation]), peak
+        )
+    return image, peak
+
+
+def convert_to_webp(name):
+    """
+    Сохраняет в хранилище WEBP-копию картинки name с длинной стороной
+    не больше IMAGE_MAX_EDGE и без метаданных EXIF и XMP (цветовой
+    профиль сохраняется). Возвращает имя копии и оценку пикового
+    объема памяти пикселей при конвертации в байтах. Результат кодируется
+    во временный файл, а не в память.
+    """
+    with default_storage.open(name) as source:
+        image = open_image(source)
+        icc_profile = image.info.get("icc_profile")
+        image, peak = decode_master(image)
+        with tempfile.TemporaryFile() as output:
+            image.save(output, format="WEBP", icc_profile=icc_profile)
+            path = default_storage.save(
+                f"{os.path.splitext(name)[0]}.webp", File(output)
+            )
+    return path, peak
+
+
+def get_renditions_config(field):
+    """Миниатюры поля field из настройки IMAGE_RENDITIONS."""
+    label = f"{field.model._meta.label}.{field.name}"
+    return settings.IMAGE_RENDITIONS.get(label, {})
+
+
+def needs_renditions(field_file):
+    """Есть ли у картинки объявленные, но еще не созданные миниатюры."""
+    field = field_file.field
+    return bool(
+        field_file
+        and field.renditions_field
+        and not getattr(field_file.instance, field.renditions_field)
+        and get_renditions_config(field)
+    )
+
+
+def build_renditions(field_file):
+    """
+    Создает миниатюры картинки движком sorl-thumbnail
+    и возвращает {имя: {"url", "width", "height"}}.
+    """
+    renditions = {}
+    for name, geometry in get_renditions_config(field_file.field).items():
+        thumbnail = get_thumbnail(field_file, geometry, **RENDITION_OPTIONS)
+        renditions[name] = {
+            "url": thumbnail.url,
+            "width": thumbnail.width,
+            "height": thumbnail.height,
+        }
+    return renditions
+
+
+def save_renditions(model, pk, field_name, image_name):
+    """
+    Создает миниатюры картинки image_name объекта и сохраняет их
+    запросом UPDATE без сигнала post_save. Если картинку объекта
+    успели заменить, миниатюры не сохраняются.
+    """
+    field = model._meta.get_field(field_name)
+    current = model.objects.filter(pk=pk, **{field_name: image_name})
+    instance = current.first()
+    if instance is None:
+        return False
+    renditions = build_renditions(getattr(instance, field_name))
+    return bool(current.update(**{field.renditions_field: renditions}))
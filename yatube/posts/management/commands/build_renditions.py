@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from posts.fields import ImageStatus
+from posts.images import save_renditions
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate declared IMAGE_RENDITIONS for post images and avatars "
+        "uploaded before renditions were stored on the models"
+    )
+
+    def handle(self, *args, **options):
+        sources = (
+            (
+                Post,
+                "image",
+                Post.objects.exclude(image="")
+                .filter(image_status=ImageStatus.READY)
+                .filter(image_renditions={}),
+            ),
+            (
+                User,
+                "avatar",
+                User.objects.exclude(avatar="")
+                .exclude(avatar__isnull=True)
+                .filter(avatar_renditions={}),
+            ),
+        )
+        for model, field_name, queryset in sources:
+            done = 0
+            for pk, image_name in queryset.values_list(
+                "pk", field_name
+            ).iterator():
+                done += save_renditions(model, pk, field_name, image_name)
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: "
+                f"миниатюры созданы для {done}"
+            )
+        self.stdout.write(self.style.SUCCESS("Миниатюры созданы"))
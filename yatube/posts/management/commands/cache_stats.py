@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from posts.utils import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show how often each feed or search cache path was taken"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--search",
+            action="store_true",
+            help="Show search result cache counters instead of feed ones",
+        )
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset counters after output"
+        )
+
+    def handle(self, *args, **options):
+        group = "search_cache_stats" if options["search"] else "cache_stats"
+        stats = get_cache_stats(group)
+        total = sum(stats.values())
+        for name, value in stats.items():
+            share = value / total if total else 0
+            self.stdout.write(f"{name:<20}{value:>10}{share:>10.1%}")
+        # устаревшая страница тоже отдается из кеша без запроса к БД
+        hits = stats["hit"] + stats["stale"] + stats["background_refresh"]
+        ratio = hits / total if total else 0
+        self.stdout.write(f"{'hit_ratio':<20}{hits:>10}{ratio:>10.1%}")
+        if options["reset"]:
+            reset_cache_stats(group)
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены"))
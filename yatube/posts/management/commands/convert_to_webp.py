@@ -1,41 +1,170 @@
-import os
-import sys
-from io import BytesIO
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-from django.conf import settings
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from PIL import Image
-from posts.models import Post
+from posts.fields import ImageStatus
+from posts.images import convert_to_webp
+from posts.models import Checkpoint, Post
+from sorl.thumbnail import delete as thumbnail_delete
+
+User = get_user_model()
+
+
+def convert_file(name):
+    """
+    Конвертирует картинку name в рабочем процессе; возвращает
+    (name, имя WEBP-копии, пиковый объем памяти пикселей) или
+    (name, None, 0), если файл не читается или слишком большой.
+    Рабочие процессы обращаются только к хранилищу, но не к БД.
+    """
+    try:
+        return name, *convert_to_webp(name)
+    except (OSError, Image.DecompressionBombError):
+        return name, None, 0
 
 
 class Command(BaseCommand):
-    help = "Convert all images to WebP format"
+    help = (
+        "Convert post images and user avatars to WebP in parallel "
+        "processes; an interrupted run resumes from a checkpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="Number of worker processes",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Images converted and written with one bulk_update",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the images that would be converted",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore saved checkpoints and start from the first row",
+        )
 
     def handle(self, *args, **options):
-        for obj in Post.objects.all():
-            # if obj.image and not obj.image.name.lower().endswith(".webp"):
-            if obj.image:
-                self.stdout.write(f"'{obj.image.name}' в процессе.")
-                img_path = os.path.join(settings.MEDIA_ROOT, obj.image.name)
-                img = Image.open(img_path)
-                img = img.convert("RGB")
-                output = BytesIO()
-                img.save(output, format="WEBP")
-                output.seek(0)
-                new_name = f"{obj.image.name.split('.')[0].split('/')[-1]}.webp"
-                new_image = InMemoryUploadedFile(
-                    output,
-                    "ImageField",
-                    new_name,
-                    "image/webp",
-                    sys.getsizeof(output),
-                    None,
+        self.options = options
+        sources = (
+            (
+                Post,
+                "image",
+                {
+                    "image_status": ImageStatus.READY,
+                    "image_renditions": {},
+                },
+            ),
+            (User, "avatar", {"avatar_renditions": {}}),
+        )
+        converted = 0
+        # рабочие процессы создаются fork и не используют соединение с БД
+        with ProcessPoolExecutor(
+            options["workers"],
+            mp_context=multiprocessing.get_context("fork"),
+        ) as executor:
+            for model, field_name, reset in sources:
+                converted += self.convert_field(
+                    executor, model, field_name, reset
                 )
-                obj.image.save(new_name, new_image, save=False)
-                obj.save()
-                os.remove(img_path)
-                self.stdout.write(f"{obj.image.name} конвертировано в формат WebP")
+        if options["dry_run"]:
+            self.stdout.write(
+                self.style.SUCCESS(f"Будет конвертировано: {converted}")
+            )
+            return
+        if converted:
+            call_command("build_renditions", stdout=self.stdout)
         self.stdout.write(
-            self.style.SUCCESS("Все изображения конвертированы в формат WebP")
+            self.style.SUCCESS(
+                f"Конвертировано в формат WebP изображений: {converted}"
+            )
+        )
+
+    def convert_field(self, executor, model, field_name, reset):
+        """
+        Конвертирует картинки поля field_name пачками по batch_size.
+        Результаты пишутся bulk_update без сигналов post_save;
+        после каждой пачки сохраняется отметка последнего id.
+        """
+        label = f"{model._meta.label}.{field_name}"
+        checkpoint_name = f"convert_to_webp:{label}"
+        checkpoint = Checkpoint.objects.filter(name=checkpoint_name).first()
+        if checkpoint is None or self.options["restart"]:
+            checkpoint = Checkpoint(
+                pk=getattr(checkpoint, "pk", None), name=checkpoint_name
+            )
+        rows = (
+            model.objects.filter(pk__gt=checkpoint.position)
+            .exclude(**{field_name: ""})
+            .exclude(**{f"{field_name}__isnull": True})
+            .exclude(**{f"{field_name}__iendswith": ".webp"})
+            .order_by("pk")
+            .values_list("pk", field_name)
+            .iterator(chunk_size=self.options["batch_size"])
+        )
+        converted = 0
+        while batch := list(islice(rows, self.options["batch_size"])):
+            if self.options["dry_run"]:
+                for pk, name in batch:
+                    self.stdout.write(f"{label} {pk}: '{name}'")
+                converted += len(batch)
+                continue
+            names = dict(batch)
+            results, peak = {}, 0
+            for name, new_name, memory in executor.map(
+                convert_file, names.values()
+            ):
+                results[name] = new_name
+                peak = max(peak, memory)
+            converted += self.save_batch(
+                model, field_name, reset, names, results
+            )
+            checkpoint.position = batch[-1][0]
+            checkpoint.save()
+            self.stdout.write(
+                f"{label}: обработано до id {checkpoint.position}, "
+                f"пик памяти пикселей {peak / 2**20:.1f} МБ"
+            )
+        if checkpoint.pk is not None and not self.options["dry_run"]:
+            checkpoint.delete()
+        return converted
+
+    def save_batch(self, model, field_name, reset, names, results):
+        """
+        Сохраняет WEBP-копии объектам, картинку которых не заменили
+        во время конвертации, и удаляет исходные файлы.
+        """
+        objects = []
+        current = model.objects.filter(pk__in=names).values_list(
+            "pk", field_name
         )
+        for pk, name in current:
+            new_name = results.get(names[pk])
+            if name != names[pk] or new_name is None:
+                continue
+            obj = model(pk=pk, **{field_name: new_name, **reset})
+            objects.append(obj)
+        model.objects.bulk_update(objects, [field_name, *reset])
+        kept = {getattr(obj, field_name).name for obj in objects}
+        for name, new_name in results.items():
+            if new_name is None:
+                self.stderr.write(f"'{name}' не удалось прочитать")
+            elif new_name in kept:
+                thumbnail_delete(name)
+            else:
+                default_storage.delete(new_name)
+        return len(objects)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from posts.partitions import convert_to_partitioned, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the ViewPost table to monthly range partitions "
+        "(PostgreSQL only). The table is locked while rows are copied."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.VIEWS_PARTITIONS_AHEAD,
+            help="Number of future monthly partitions to create",
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="Keep the original table as posts_viewpost_unpartitioned",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Секционирование доступно только в PostgreSQL")
+        if is_partitioned():
+            raise CommandError("Таблица просмотров уже секционирована")
+        convert_to_partitioned(options["months_ahead"], options["keep_old"])
+        self.stdout.write(
+            self.style.SUCCESS("Таблица просмотров секционирована по месяцам")
+        )
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts.partitions import is_partitioned
+from posts.tasks import prune_post_views
+
+
+class Command(BaseCommand):
+    help = "Remove post views older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=settings.VIEWS_RETENTION_MONTHS,
+            help="Keep views of this many months",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.VIEWS_PRUNE_BATCH_SIZE,
+            help="Rows deleted per transaction on a non-partitioned table",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0,
+            help="Seconds to sleep between delete batches",
+        )
+        parser.add_argument(
+            "--archive",
+            action="store_true",
+            default=None,
+            help="Detach old partitions instead of dropping them",
+        )
+
+    def handle(self, *args, **options):
+        partitioned = is_partitioned()
+        removed = prune_post_views(
+            options["months"],
+            options["batch_size"],
+            options["pause"],
+            options["archive"],
+        )
+        unit = "секций" if partitioned else "записей"
+        self.stdout.write(
+            self.style.SUCCESS(f"Удалено старых {unit} просмотров: {removed}")
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.models import Checkpoint, TimelineEntry
+from posts.tasks import backfill_timeline
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild materialized follow timelines one follower at a time; "
+        "an interrupted run resumes from a checkpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the saved checkpoint and start from the first user",
+        )
+
+    def handle(self, *args, **options):
+        checkpoint, _ = Checkpoint.objects.get_or_create(
+            name="rebuild_timelines"
+        )
+        if options["restart"]:
+            checkpoint.position = 0
+        user_ids = (
+            User.objects.filter(pk__gt=checkpoint.position)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        total = 0
+        for user_id in user_ids.iterator():
+            # лента пользователя заменяется целиком в одной транзакции,
+            # прерванный запуск не оставляет пустых лент
+            with transaction.atomic():
+                TimelineEntry.objects.filter(user_id=user_id).delete()
+                for author_id in Follow.objects.filter(
+                    user_id=user_id
+                ).values_list("author_id", flat=True):
+                    backfill_timeline(user_id, author_id)
+                checkpoint.position = user_id
+                checkpoint.save(update_fields=("position", "updated_at"))
+            total += 1
+        # следующий запуск снова начнет с первого пользователя
+        checkpoint.delete()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ленты подписок пересобраны для {total} пользователей"
+            )
+        )
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recount stored views_count and comments_count of posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of posts recounted per query",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        # при VIEWS_HLL просмотры считают скетчи, а при хранении
+        # ViewPost ограниченный срок в таблице нет старых просмотров
+        fields = ("comments_count",)
+        if not (settings.VIEWS_HLL or settings.VIEWS_RETENTION_MONTHS):
+            fields += ("views_count",)
+        post_ids = Post.objects.order_by("pk").values_list("pk", flat=True)
+        fixed = last_id = 0
+        while batch := list(post_ids.filter(pk__gt=last_id)[:batch_size]):
+            last_id = batch[-1]
+            fixed += Post.objects.filter(
+                pk__range=(batch[0], last_id)
+            ).reconcile_counters(fields)
+        self.stdout.write(
+            self.style.SUCCESS(f"Исправлены счетчики постов: {fixed}")
+        )
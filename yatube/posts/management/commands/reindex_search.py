@@ -0,0 +1,117 @@
+import contextlib
+import multiprocessing
+import time
+
+from django.contrib.postgres.search import SearchVector
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import get_current_timezone, is_naive, make_aware
+from posts.models import Checkpoint, Post
+
+# Тот же вектор, что строит триггер БД: заголовок с весом A, текст - B
+SEARCH_VECTOR = SearchVector(
+    "title", weight="A", config="russian"
+) + SearchVector("text", weight="B", config="russian")
+
+
+def reindex_range(bounds):
+    """
+    Пересчитывает search_vector постов с id из полуинтервала bounds.
+    Триггер БД сохраняет явно записанный вектор.
+    """
+    start, end, changed_since = bounds
+    posts = Post.objects.filter(pk__gte=start, pk__lt=end)
+    if changed_since is not None:
+        posts = posts.filter(updated_at__gte=changed_since)
+    return end, posts.update(search_vector=SEARCH_VECTOR)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild Post.search_vector in id-ranged batches, optionally in "
+        "parallel processes; an interrupted run resumes from a checkpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Width of an id range updated by one statement",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes",
+        )
+        parser.add_argument(
+            "--changed-since",
+            help="Only posts changed since this date or ISO datetime",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the saved checkpoint and start from the first post",
+        )
+
+    def handle(self, *args, **options):
+        changed_since = self.parse_since(options["changed_since"])
+        name = "reindex_search"
+        if changed_since is not None:
+            name = f"{name}:{changed_since.isoformat()}"
+        checkpoint, _ = Checkpoint.objects.get_or_create(name=name)
+        if options["restart"]:
+            checkpoint.position = 0
+        last_id = Post.objects.aggregate(last_id=Max("pk"))["last_id"] or 0
+        batch_size = options["batch_size"]
+        ranges = [
+            (start, start + batch_size, changed_since)
+            for start in range(
+                checkpoint.position + 1, last_id + 1, batch_size
+            )
+        ]
+        started, total = time.monotonic(), 0
+        with contextlib.ExitStack() as stack:
+            results = map(reindex_range, ranges)
+            if options["workers"] > 1:
+                # дочерние процессы открывают собственные соединения с БД
+                connections.close_all()
+                pool = stack.enter_context(
+                    multiprocessing.Pool(options["workers"])
+                )
+                # imap возвращает результаты по порядку диапазонов,
+                # поэтому отметка не перескакивает необработанные диапазоны
+                results = pool.imap(reindex_range, ranges)
+            for end, rows in results:
+                total += rows
+                checkpoint.position = end - 1
+                checkpoint.save(update_fields=("position", "updated_at"))
+                rate = total / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f"id < {end}: {total} постов, {rate:.0f} постов/с"
+                )
+        # следующий запуск снова начнет с первого поста
+        checkpoint.delete()
+        elapsed = time.monotonic() - started
+        rate = total / max(elapsed, 1e-6)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Поисковые векторы пересчитаны: {total} постов "
+                f"за {elapsed:.1f} с ({rate:.0f} постов/с)"
+            )
+        )
+
+    def parse_since(self, value):
+        if value is None:
+            return None
+        since = parse_datetime(value)
+        if since is None and (day := parse_date(value)) is not None:
+            since = parse_datetime(f"{day.isoformat()}T00:00")
+        if since is None:
+            raise CommandError(f"Неверная дата --changed-since: {value}")
+        if is_naive(since):
+            since = make_aware(since, get_current_timezone())
+        return since
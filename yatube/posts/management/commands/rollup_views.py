@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from posts.models import AuthorDailyViews, Checkpoint, PostDailyViews
+from posts.tasks import rollup_post_views
+
+
+class Command(BaseCommand):
+    help = "Aggregate post views into daily post and author rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Drop rollups and rebuild them from all ViewPost rows",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Number of ViewPost rows aggregated per transaction",
+        )
+
+    def handle(self, *args, **options):
+        if options["full"] and settings.VIEWS_HLL:
+            raise CommandError(
+                "При VIEWS_HLL сводки учитывают анонимные просмотры "
+                "и не пересобираются по ViewPost"
+            )
+        if options["full"]:
+            PostDailyViews.objects.all().delete()
+            AuthorDailyViews.objects.all().delete()
+            Checkpoint.objects.filter(name="rollup_post_views").delete()
+        processed = rollup_post_views(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Обработано просмотров: {processed}")
+        )
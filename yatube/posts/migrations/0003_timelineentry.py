@@ -0,0 +1,111 @@
+# Generated by Django 5.1 on 2026-10-18 19:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_timelines(apps, schema_editor):
+    """
+    Ленты существующих подписок. Посты авторов, у которых больше
+    TIMELINE_FANOUT_LIMIT подписчиков, подмешиваются при чтении
+    и не записываются; записи пишутся пачками по TIMELINE_BATCH_SIZE.
+    """
+    Follow = apps.get_model("users", "Follow")
+    Post = apps.get_model("posts", "Post")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    author_ids = (
+        Follow.objects.values("author_id")
+        .annotate(followers=Count("id"))
+        .filter(followers__lte=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list("author_id", flat=True)
+    )
+    entries = []
+    for author_id in author_ids.iterator():
+        user_ids = list(
+            Follow.objects.filter(author_id=author_id).values_list("user_id", flat=True)
+        )
+        post_ids = Post.objects.filter(author_id=author_id).values_list("id", flat=True)
+        for post_id in post_ids.iterator(chunk_size=batch_size):
+            entries.extend(
+                TimelineEntry(user_id=user_id, post_id=post_id, author_id=author_id)
+                for user_id in user_ids
+            )
+            if len(entries) >= batch_size:
+                TimelineEntry.objects.bulk_create(entries)
+                entries = []
+    TimelineEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0002_alter_comment_id_alter_group_id_alter_post_id_and_more"),
+        ("users", "0006_follow_created_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="viewpost",
+            options={"verbose_name": "Просмотр", "verbose_name_plural": "Просмотры"},
+        ),
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="автор поста",
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to="posts.post",
+                        verbose_name="пост",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="подписчик",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись ленты",
+                "verbose_name_plural": "Записи ленты",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "author"], name="posts_timel_user_id_b036fb_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "post"), name="unique_timeline_entry"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
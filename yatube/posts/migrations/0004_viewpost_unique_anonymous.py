@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-18 19:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def delete_duplicate_views(apps, schema_editor):
+    """Оставляет по одному анонимному просмотру поста с каждого IP."""
+    ViewPost = apps.get_model("posts", "ViewPost")
+    first_views = (
+        ViewPost.objects.filter(user__isnull=True)
+        .values("post", "ip_address")
+        .annotate(first_id=models.Min("id"))
+        .values("first_id")
+    )
+    ViewPost.objects.filter(user__isnull=True).exclude(id__in=first_views).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0003_timelineentry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_views, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="viewpost",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", True)),
+                fields=("post", "ip_address"),
+                name="unique_anonymous_view_post",
+            ),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.1 on 2026-10-18 19:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0005_post_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Checkpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="название"
+                    ),
+                ),
+                ("position", models.BigIntegerField(default=0, verbose_name="позиция")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="обновлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Отметка обработки",
+                "verbose_name_plural": "Отметки обработки",
+            },
+        ),
+        migrations.CreateModel(
+            name="AuthorDailyViews",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="день")),
+                (
+                    "views",
+                    models.PositiveIntegerField(default=0, verbose_name="просмотры"),
+                ),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_views",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="автор",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Просмотры автора за день",
+                "verbose_name_plural": "Просмотры авторов по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("author", "day"), name="unique_author_daily_views"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PostDailyViews",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="день")),
+                (
+                    "views",
+                    models.PositiveIntegerField(default=0, verbose_name="просмотры"),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_views",
+                        to="posts.post",
+                        verbose_name="пост",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Просмотры поста за день",
+                "verbose_name_plural": "Просмотры постов по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("post", "day"), name="unique_post_daily_views"
+                    )
+                ],
+            },
+        ),
+    ]
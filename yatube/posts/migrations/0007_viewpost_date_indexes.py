@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 19:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0006_view_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="viewpost",
+            index=models.Index(
+                fields=["user", "date_of_viewing"],
+                name="posts_viewp_user_id_280d18_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="viewpost",
+            index=models.Index(
+                fields=["date_of_viewing"], name="posts_viewp_date_of_5b0a40_idx"
+            ),
+        ),
+    ]
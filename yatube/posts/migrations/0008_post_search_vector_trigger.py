@@ -0,0 +1,53 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_TRIGGER = """
+CREATE FUNCTION posts_post_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT'
+        OR NEW.title IS DISTINCT FROM OLD.title
+        OR NEW.text IS DISTINCT FROM OLD.text
+        OR NEW.search_vector IS NULL
+    THEN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    ELSE
+        NEW.search_vector := OLD.search_vector;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_post_search_vector_update
+    BEFORE INSERT OR UPDATE ON posts_post
+    FOR EACH ROW EXECUTE FUNCTION posts_post_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS posts_post_search_vector_update ON posts_post;
+DROP FUNCTION IF EXISTS posts_post_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0007_viewpost_date_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        # пересчет векторов существующих постов с весами A и B
+        migrations.RunSQL(
+            "UPDATE posts_post SET search_vector = NULL",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+INDEXES = {
+    "posts_post_group_search_idx": "group_id",
+    "posts_post_author_search_idx": "author_id",
+}
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Составные GIN-индексы (группа или автор, search_vector) для поиска
+    с фильтром. Требуют расширения btree_gin; без него поиск с фильтром
+    использует GIN-индекс search_vector и индекс внешнего ключа.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gin'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+        for name, column in INDEXES.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON posts_post USING gin ({column}, search_vector)"
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name in INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0009_post_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
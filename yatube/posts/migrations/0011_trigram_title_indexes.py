@@ -0,0 +1,40 @@
+from django.db import migrations
+
+INDEXES = {
+    "posts_post_title_trgm_idx": "posts_post",
+    "posts_group_title_trgm_idx": "posts_group",
+}
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Триграммные GIN-индексы по UPPER(title) для подсказок поиска:
+    istartswith в PostgreSQL сравнивает UPPER(поле) LIKE UPPER(шаблон).
+    Требуют расширения pg_trgm; без него подсказки работают без индекса.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table in INDEXES.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} "
+                f"ON {table} USING gin (UPPER(title) gin_trgm_ops)"
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name in INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("posts", "0010_post_search_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 20:08
+
+import posts.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0011_trigram_title_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_status",
+            field=models.CharField(
+                choices=[
+                    ("ready", "Готова"),
+                    ("pending", "Конвертируется"),
+                    ("failed", "Ошибка конвертации"),
+                ],
+                default="ready",
+                editable=False,
+                max_length=10,
+                verbose_name="Статус картинки",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=posts.fields.WEBPField(
+                blank=True,
+                status_field="image_status",
+                upload_to="posts/",
+                verbose_name="Картинка",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-18 20:10
+
+import posts.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0012_post_image_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_renditions",
+            field=models.JSONField(
+                default=dict, editable=False, verbose_name="Миниатюры картинки"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=posts.fields.WEBPField(
+                blank=True,
+                renditions_field="image_renditions",
+                status_field="image_status",
+                upload_to="posts/",
+                verbose_name="Картинка",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-18 20:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0013_post_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="timelineentry",
+            name="pub_date",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                verbose_name="дата публикации поста",
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE posts_timelineentry AS entry
+            SET pub_date = post.pub_date
+            FROM posts_post AS post
+            WHERE post.id = entry.post_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_pub_date_idx",
+            ),
+        ),
+    ]
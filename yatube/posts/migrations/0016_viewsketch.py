@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0015_post_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ViewSketch",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        max_length=100,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ключ",
+                    ),
+                ),
+                ("registers", models.BinaryField(verbose_name="регистры")),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="истекает"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Скетч уникальных просмотров",
+                "verbose_name_plural": "Скетчи уникальных просмотров",
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+
+# Вектор пересчитывается только при вставке и изменении title или text.
+# NULL, который пишет save() нового экземпляра, заменяется старым
+# вектором; явно записанный вектор (reindex_search) сохраняется.
+UPDATE_FUNCTION = """
+CREATE OR REPLACE FUNCTION posts_post_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT'
+        OR NEW.title IS DISTINCT FROM OLD.title
+        OR NEW.text IS DISTINCT FROM OLD.text
+    THEN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    ELSIF NEW.search_vector IS NULL THEN
+        NEW.search_vector := OLD.search_vector;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+RESTORE_FUNCTION = """
+CREATE OR REPLACE FUNCTION posts_post_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT'
+        OR NEW.title IS DISTINCT FROM OLD.title
+        OR NEW.text IS DISTINCT FROM OLD.text
+        OR NEW.search_vector IS NULL
+    THEN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    ELSE
+        NEW.search_vector := OLD.search_vector;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0016_viewsketch"),
+    ]
+
+    operations = [
+        migrations.RunSQL(UPDATE_FUNCTION, RESTORE_FUNCTION),
+    ]
@@ -1,20 +1,42 @@
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.postgres.search import (
-    SearchHeadline,
-    SearchQuery,
-    SearchRank,
-)
-from django.core.cache import cache
-from django.db.models import QuerySet
+from django.contrib.postgres.search import SearchQuery
+from django.core.paginator import Page
 from django.shortcuts import redirect
 from django.views.generic import ListView
 
 from .models import Post
+from .paginators import KeysetPage, KeysetPaginator
+from .search import add_headlines, search_posts
+from .tasks import refresh_page_cache
+from .utils import get_cache_versions, get_or_build_cache, set_cache_entry
 
 
-class PostMixinListView(ListView):
+class KeysetPaginationMixin:
+    """
+    Класс-миксин постраничного вывода по ключу (pub_date, id).
+    Включается атрибутом keyset_pagination или настройкой
+    KEYSET_PAGINATION; страница выбирается по GET-параметру cursor.
+    """
+
+    keyset_pagination = None
+    cursor_kwarg = "cursor"
+
+    def use_keyset_pagination(self):
+        if self.keyset_pagination is None:
+            return settings.KEYSET_PAGINATION
+        return self.keyset_pagination
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class PostMixinListView(KeysetPaginationMixin, ListView):
     """Класс-миксин представления списка постов."""
 
     template_name = "posts/index.html"
@@ -39,52 +61,150 @@ class PostMixinListView(ListView):
 
 
 class SearchMixin:
-    """Класс-миксин для поиска постов."""
+    """
+    Класс-миксин для поиска постов.
+    Ранжирование и постраничный вывод используют только индексируемое
+    поле search_vector; фрагменты с подсветкой (ts_headline заново
+    разбирает весь документ) строятся лишь для постов текущей страницы.
+    GET-параметр group ограничивает поиск группой со slug.
+    """
+
+    search_query = None
 
     def get_queryset(self):
         queryset = super().get_queryset()
         if query := self.request.GET.get("search", None):
-            query = SearchQuery(query, config="russian")
-            queryset = (
-                queryset.annotate(rank=SearchRank("search_vector", query))
-                .filter(search_vector=query, rank__gt=0)
-                .order_by("-rank")
-            )
-            queryset = queryset.annotate(
-                headline=SearchHeadline(
-                    "title",
-                    query,
-                    start_sel='<span style="background-color: red;">',
-                    stop_sel="</span>",
-                    config="russian",
-                )
-            )
-            queryset = queryset.annotate(
-                bodyline=SearchHeadline(
-                    "text",
-                    query,
-                    start_sel='<span style="background-color: red;">',
-                    stop_sel="</span>",
-                    config="russian",
-                )
-            )
-            return queryset
+            self.search_query = SearchQuery(query, config="russian")
+            queryset = search_posts(self.search_query, queryset)
+            if slug := self.request.GET.get("group"):
+                queryset = queryset.filter(group__slug=slug)
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        result = super().paginate_queryset(queryset, page_size)
+        if self.search_query is not None:
+            add_headlines(result[2], self.search_query)
+        return result
+
 
 class CacheMixin:
     """
     Миксин для управление кешированием.
+    Для каждой страницы ленты в кеше хранятся только упорядоченные
+    id постов и данные паджинатора, посты загружаются одним запросом.
+    В ключ кеша входят поколения пространств имен cache_namespaces.
+    Перестройку страницы выполняет один запрос; по настройкам
+    возможны досрочное обновление и фоновое обновление через Celery
+    с отдачей устаревшей страницы.
     """
 
     cache_timeout = 900
+    cache_stale_timeout = settings.CACHE_STALE_TIMEOUT
+    cache_early_refresh = settings.CACHE_EARLY_REFRESH
+    cache_background_refresh = settings.CACHE_BACKGROUND_REFRESH
+    cache_name = None
+    cache_namespaces = ()
+    cache_stats = "cache_stats"
+
+    def get_cache_name(self) -> str:
+        return self.cache_name
+
+    def get_cache_namespaces(self):
+        return self.cache_namespaces
 
-    def get_cache(self, query: QuerySet, cache_name: str, cache_timeout: int):
-        data = cache.get(cache_name)
-        if not data:
-            data = query
-            cache.set(cache_name, query, cache_timeout)
-        return data
+    def get_cache_key(self) -> str:
+        versions = get_cache_versions(*self.get_cache_namespaces())
+        return ":".join([self.get_cache_name(), *map(str, versions)])
+
+    def get_page_key(self) -> str:
+        if self.use_keyset_pagination():
+            return f"cursor:{self.request.GET.get(self.cursor_kwarg, '')}"
+        page = (
+            self.kwargs.get(self.page_kwarg)
+            or self.request.GET.get(self.page_kwarg)
+            or 1
+        )
+        return f"page:{page}"
+
+    def get_page_cache_key(self) -> str:
+        return f"{self.get_cache_key()}:{self.get_page_key()}"
+
+    def paginate_queryset(self, queryset, page_size):
+        result = None
+
+        def build_page_state():
+            nonlocal result
+            result = super(CacheMixin, self).paginate_queryset(
+                queryset, page_size
+            )
+            return self.get_page_state(result[1])
+
+        state = get_or_build_cache(
+            self.get_page_cache_key(),
+            build_page_state,
+            self.cache_timeout,
+            stale_timeout=self.cache_stale_timeout,
+            early_refresh=self.cache_early_refresh,
+            refresh=(
+                self.schedule_cache_refresh
+                if self.cache_background_refresh
+                else None
+            ),
+            stats=self.cache_stats,
+        )
+        if result is not None:
+            return result
+        return self.restore_page(queryset, page_size, state)
+
+    def schedule_cache_refresh(self):
+        """Поручает перестройку страницы задаче Celery."""
+        view_class = type(self)
+        refresh_page_cache.delay(
+            f"{view_class.__module__}.{view_class.__qualname__}",
+            self.kwargs,
+            self.request.GET.urlencode(),
+        )
+
+    def rebuild_page_cache(self):
+        """Перестраивает и сохраняет в кеш текущую страницу."""
+        queryset = self.get_queryset()
+        page_size = self.get_paginate_by(queryset)
+        page = super().paginate_queryset(queryset, page_size)[1]
+        set_cache_entry(
+            self.get_page_cache_key(),
+            self.get_page_state(page),
+            self.cache_timeout,
+            self.cache_stale_timeout,
+        )
+
+    def get_page_state(self, page) -> dict:
+        """Данные страницы для кеша: id постов и положение страницы."""
+        state = {"ids": [post.pk for post in page.object_list]}
+        if getattr(page, "is_keyset", False):
+            state.update(next=page.next_cursor, previous=page.previous_cursor)
+        else:
+            state.update(number=page.number, count=page.paginator.count)
+        return state
+
+    def restore_page(self, queryset, page_size, state):
+        """Восстанавливает страницу из кеша одним запросом id__in."""
+        posts = queryset.in_bulk(state["ids"])
+        object_list = [posts[pk] for pk in state["ids"] if pk in posts]
+        if "count" in state:
+            paginator = self.get_paginator(
+                queryset,
+                page_size,
+                orphans=self.get_paginate_orphans(),
+                allow_empty_first_page=self.get_allow_empty(),
+            )
+            paginator.count = state["count"]
+            page = Page(object_list, state["number"], paginator)
+        else:
+            paginator = KeysetPaginator(queryset, page_size)
+            page = KeysetPage(
+                object_list, paginator, state["next"], state["previous"]
+            )
+        return paginator, page, page.object_list, page.has_other_pages()
 
 
 class IsAuthorAndLoginRequiredMixin(LoginRequiredMixin):
@@ -1,42 +1,66 @@
+from core.querysets import CounterQuerySetMixin
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.indexes import GinIndex
-from django.contrib.postgres.search import SearchVector, SearchVectorField
-from django.db import models
-from django.db.models import Count
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
-from .fields import WEBPField
+from .fields import ImageStatus, WEBPField
+from .paginators import seek_queryset
 
 User = get_user_model()
 
 
-class PostQuerySet(models.QuerySet):
-    def get_views_count(self):
-        """Количество просмотров поста."""
-        queryset = self.annotate(
-            views_count=Count("view_posts", distinct=True)
-        )
-        return queryset
+class PostQuerySet(CounterQuerySetMixin, models.QuerySet):
+    def reconcile_counters(self, fields=("views_count", "comments_count")):
+        """
+        Пересчитывает счетчики fields по таблицам ViewPost и Comment;
+        возвращает число исправленных постов.
+        """
+        sources = {"views_count": ViewPost, "comments_count": Comment}
+        actual = {
+            field: Coalesce(
+                Subquery(
+                    sources[field]
+                    .objects.filter(post=OuterRef("pk"))
+                    .values("post")
+                    .annotate(count=Count("id"))
+                    .values("count")
+                ),
+                0,
+            )
+            for field in fields
+        }
+        drifted = self.alias(
+            **{f"actual_{field}": value for field, value in actual.items()}
+        ).exclude(**{field: F(f"actual_{field}") for field in fields})
+        return self.filter(pk__in=drifted.values("pk")).update(**actual)
 
-    def get_count_posts_of_author(self):
-        """Количество постов у определенного автора."""
-        queryset = self.annotate(
-            count_posts_of_author=Count("author__posts", distinct=True)
-        )
-        return queryset
+    def get_timeline(self, user, pulled_authors=()):
+        """
+        Лента подписок пользователя из материализованной таблицы;
+        посты авторов из pulled_authors подмешиваются при чтении.
+        """
+        return Timeline(self, user, pulled_authors)
 
 
 class PostManager(models.Manager):
     def get_queryset(self) -> models.QuerySet:
         return PostQuerySet(self.model, using=self._db)
 
-    def get_views_count(self):
-        """Количество просмотров поста."""
-        return self.get_queryset().get_views_count()
+    def increment(self, field_name, amounts):
+        """Увеличивает счетчики постов."""
+        return self.get_queryset().increment(field_name, amounts)
+
+    def reconcile_counters(self, fields=("views_count", "comments_count")):
+        """Пересчитывает счетчики постов."""
+        return self.get_queryset().reconcile_counters(fields)
 
-    def get_count_posts_of_author(self):
-        """Количество постов у определенного автора."""
-        return self.get_queryset().get_count_posts_of_author()
+    def get_timeline(self, user, pulled_authors=()):
+        """Лента подписок пользователя."""
+        return self.get_queryset().get_timeline(user, pulled_authors)
 
 
 class Group(models.Model):
@@ -66,6 +90,9 @@ class Post(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name="дата публикации"
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, db_index=True, verbose_name="дата изменения"
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -80,13 +107,51 @@ class Post(models.Model):
         related_name="posts",
         verbose_name="название группы",
     )
-    image = WEBPField("Картинка", upload_to="posts/", blank=True)
-    search_vector = SearchVectorField(null=True)
+    image = WEBPField(
+        "Картинка",
+        upload_to="posts/",
+        blank=True,
+        status_field="image_status",
+        renditions_field="image_renditions",
+    )
+    image_status = models.CharField(
+        "Статус картинки",
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        editable=False,
+    )
+    # {имя миниатюры: {"url", "width", "height"}}, заполняется задачей
+    image_renditions = models.JSONField(
+        "Миниатюры картинки", default=dict, editable=False
+    )
+    # заполняется триггером БД: заголовок с весом A, текст с весом B
+    search_vector = SearchVectorField(null=True, editable=False)
+    views_count = models.PositiveIntegerField(
+        "Кол-во просмотров", default=0, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        "Кол-во комментариев", default=0, editable=False
+    )
     objects = PostManager()
 
     class Meta:
+        # составные индексы (group, search_vector) и (author, search_vector)
+        # для поиска с фильтром создаются миграцией при наличии btree_gin
         indexes = [
             GinIndex(fields=["search_vector"]),
+            # ленты по ключу (pub_date, id): общая, группы и автора
+            models.Index(
+                fields=["-pub_date", "-id"], name="post_pub_date_idx"
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_pub_date_idx",
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_pub_date_idx",
+            ),
         ]
         ordering = ["-pub_date"]
         verbose_name = "Пост"
@@ -98,11 +163,47 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse("posts:post_detail", kwargs={"post_id": self.pk})
 
-    def update_search_vector(self) -> None:
-        qs = Post.objects.filter(pk=self.pk)
-        qs.update(
-            search_vector=SearchVector("title", "text", config="russian")
-        )
+    def save(self, *args, **kwargs):
+        # счетчики автора обновляются сигналами в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        deferred_fields = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in deferred_fields
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_loaded_value(self, field_name):
+        """Значение поля на момент загрузки объекта из БД."""
+        return getattr(self, "_loaded_values", {}).get(field_name)
+
+
+class CommentQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        Удаляет комментарии и уменьшает счетчики их постов.
+        Каскадное удаление вместе с постом идет в обход этого метода
+        одним DELETE, без обновления удаляемого поста.
+        """
+        with transaction.atomic():
+            counts = dict(
+                self.order_by()
+                .values_list("post_id")
+                .annotate(count=Count("id"))
+            )
+            deleted = super().delete()
+            Post.objects.increment(
+                "comments_count",
+                {post_id: -count for post_id, count in counts.items()},
+            )
+        return deleted
 
 
 class Comment(models.Model):
@@ -123,9 +224,18 @@ class Comment(models.Model):
     text = models.TextField(verbose_name="текст комментария")
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
     def __str__(self):
         return self.text[:15]
 
+    def delete(self, *args, **kwargs):
+        """Удаляет комментарий и уменьшает счетчик комментариев поста."""
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            Post.objects.increment("comments_count", {self.post_id: -1})
+        return deleted
+
     class Meta:
         ordering = ["-created"]
         verbose_name = "Комментарий"
@@ -154,8 +264,248 @@ class ViewPost(models.Model):
     class Meta:
         verbose_name = "Просмотр"
         verbose_name_plural = "Просмотры"
+        # После partition_views этих ограничений в БД нет (см.
+        # convert_to_partitioned), уникальность обеспечивает
+        # flush_post_views; в модели они остаются для несекционированной
+        # таблицы и не должны удаляться миграцией.
         constraints = [
             models.UniqueConstraint(
                 fields=("post", "user"), name="unique_view_post"
+            ),
+            models.UniqueConstraint(
+                fields=("post", "ip_address"),
+                condition=models.Q(user__isnull=True),
+                name="unique_anonymous_view_post",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=("user", "date_of_viewing")),
+            models.Index(fields=("date_of_viewing",)),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Модель материализованной ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="подписчик",
+    )
+    post = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="пост",
+    )
+    author = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="автор поста",
+    )
+    # копия даты поста: страница ленты читается по индексу этой таблицы
+    pub_date = models.DateTimeField("дата публикации поста")
+
+    def __str__(self) -> str:
+        return f"{self.post} в ленте {self.user}"
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("user", "post"), name="unique_timeline_entry"
             )
         ]
+        indexes = [
+            models.Index(fields=("user", "author")),
+            models.Index(
+                fields=("user", "-pub_date", "-post"),
+                name="timeline_user_pub_date_idx",
+            ),
+        ]
+
+
+class Timeline:
+    """
+    Лента подписок пользователя для паджинаторов.
+    Страница читается по индексу (user, -pub_date, -post) таблицы
+    TimelineEntry, посты авторов из pulled_authors - по индексу
+    (author, -pub_date) таблицы постов; обе выборки ограничены
+    концом страницы, посты загружаются одним запросом по id.
+    """
+
+    def __init__(self, posts, user, pulled_authors=()):
+        self.posts = posts
+        self.user = user
+        self.pulled_authors = list(pulled_authors)
+
+    def get_sources(self):
+        """
+        Выборки материализованной ленты и постов авторов pulled_authors
+        с именем поля id поста в каждой.
+        """
+        entries = TimelineEntry.objects.filter(user=self.user)
+        if not self.pulled_authors:
+            return [(entries, "post_id")]
+        # записи, разосланные до перехода автора к чтению напрямую,
+        # не учитываются, чтобы посты не повторялись
+        return [
+            (entries.exclude(author_id__in=self.pulled_authors), "post_id"),
+            (Post.objects.filter(author_id__in=self.pulled_authors), "id"),
+        ]
+
+    def count(self):
+        return sum(source.count() for source, _ in self.get_sources())
+
+    def seek(self, limit, position=None, reverse=False, offset=0):
+        """
+        Посты ленты после позиции position = (pub_date, id):
+        от новых к старым или, при reverse, от старых к новым.
+        """
+        end = offset + limit
+        queries = [
+            seek_queryset(source, position, reverse, id_field).values_list(
+                "pub_date", id_field
+            )[:end]
+            for source, id_field in self.get_sources()
+        ]
+        rows = queries[0]
+        if len(queries) > 1:
+            sign = "" if reverse else "-"
+            rows = rows.union(*queries[1:], all=True).order_by(
+                f"{sign}pub_date", f"{sign}post_id"
+            )
+        ids = [post_id for _, post_id in rows[offset:end]]
+        posts = self.posts.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            return self.seek(key.stop - start, offset=start)
+        return self.seek(1, offset=key)[0]
+
+
+class DailyViewsQuerySet(CounterQuerySetMixin, models.QuerySet):
+    def add_views(self, field_name, day, amounts):
+        """
+        Прибавляет amounts[id] к просмотрам за день day объектов
+        по полю field_name (post или author), создавая недостающие
+        записи сводки.
+        """
+        amounts = {pk: amount for pk, amount in amounts.items() if amount}
+        self.bulk_create(
+            (
+                self.model(**{f"{field_name}_id": pk, "day": day})
+                for pk in amounts
+            ),
+            ignore_conflicts=True,
+        )
+        rows = self.filter(day=day, **{f"{field_name}_id__in": amounts})
+        self.increment(
+            "views",
+            {
+                pk: amounts[owner_id]
+                for owner_id, pk in rows.values_list(f"{field_name}_id", "pk")
+            },
+        )
+
+
+class PostDailyViews(models.Model):
+    """
+    Модель просмотров поста за день, сводка по ViewPost;
+    при VIEWS_HLL пополняется приростом скетчей в flush_post_views.
+    """
+
+    post = models.ForeignKey(
+        to=Post,
+        on_delete=models.CASCADE,
+        related_name="daily_views",
+        verbose_name="пост",
+    )
+    day = models.DateField("день")
+    views = models.PositiveIntegerField("просмотры", default=0)
+
+    objects = DailyViewsQuerySet.as_manager()
+
+    def __str__(self) -> str:
+        return f"{self.post} - {self.day}: {self.views}"
+
+    class Meta:
+        verbose_name = "Просмотры поста за день"
+        verbose_name_plural = "Просмотры постов по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("post", "day"), name="unique_post_daily_views"
+            )
+        ]
+
+
+class AuthorDailyViews(models.Model):
+    """
+    Модель просмотров постов автора за день, сводка по ViewPost;
+    при VIEWS_HLL пополняется приростом скетчей в flush_post_views.
+    """
+
+    author = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name="daily_views",
+        verbose_name="автор",
+    )
+    day = models.DateField("день")
+    views = models.PositiveIntegerField("просмотры", default=0)
+
+    objects = DailyViewsQuerySet.as_manager()
+
+    def __str__(self) -> str:
+        return f"{self.author} - {self.day}: {self.views}"
+
+    class Meta:
+        verbose_name = "Просмотры автора за день"
+        verbose_name_plural = "Просмотры авторов по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("author", "day"), name="unique_author_daily_views"
+            )
+        ]
+
+
+class Checkpoint(models.Model):
+    """
+    Модель отметки о месте, до которого фоновая обработка
+    уже прошла, чтобы следующий запуск продолжал с нее.
+    """
+
+    name = models.CharField("название", max_length=100, unique=True)
+    position = models.BigIntegerField("позиция", default=0)
+    updated_at = models.DateTimeField("обновлено", auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.position}"
+
+    class Meta:
+        verbose_name = "Отметка обработки"
+        verbose_name_plural = "Отметки обработки"
+
+
+class ViewSketch(models.Model):
+    """
+    Модель скетча HyperLogLog уникальных посетителей, когда для скетчей
+    не настроен отдельный Redis (VIEWS_REDIS_URL). В отличие от кеша,
+    не теряется при вытеснении и очистке.
+    """
+
+    key = models.CharField("ключ", max_length=100, primary_key=True)
+    registers = models.BinaryField("регистры")
+    expires_at = models.DateTimeField("истекает", null=True, blank=True)
+
+    def __str__(self) -> str:
+        return self.key
+
+    class Meta:
+        verbose_name = "Скетч уникальных просмотров"
+        verbose_name_plural = "Скетчи уникальных просмотров"
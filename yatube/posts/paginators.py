@@ -0,0 +1,137 @@
+import base64
+from collections.abc import Sequence
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def seek_queryset(queryset, position=None, reverse=False, id_field="id"):
+    """
+    queryset по ключу (pub_date, id_field) после позиции
+    position = (pub_date, id): от новых к старым или, при reverse,
+    от старых к новым. Общий для всех лент, чтобы посты с одинаковым
+    pub_date везде упорядочивались одинаково.
+    """
+    sign = "" if reverse else "-"
+    queryset = queryset.order_by(f"{sign}pub_date", f"{sign}{id_field}")
+    if position is None:
+        return queryset
+    pub_date, pk = position
+    after = "gt" if reverse else "lt"
+    # отдельное условие на pub_date задает границу чтения индекса
+    return queryset.filter(
+        Q(**{f"pub_date__{after}": pub_date})
+        | Q(pub_date=pub_date, **{f"{id_field}__{after}": pk}),
+        **{f"pub_date__{after}e": pub_date},
+    )
+
+
+class KeysetPage(Sequence):
+    """Страница паджинатора по ключу."""
+
+    is_keyset = True
+
+    def __init__(
+        self, object_list, paginator, next_cursor=None, previous_cursor=None
+    ):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage {self.previous_cursor}:{self.next_cursor}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Паджинатор по ключу (pub_date, id).
+    Не выполняет COUNT и OFFSET: каждая страница читается
+    по индексу (-pub_date, -id) постов (для лент группы и автора -
+    по составным индексам с group и author) от позиции из курсора.
+    """
+
+    NEXT = "n"
+    PREVIOUS = "p"
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, obj, direction):
+        position = f"{direction}|{obj.pub_date.isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, pub_date, id) или None."""
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode()).decode()
+            direction, pub_date, pk = position.split("|")
+            pub_date, pk = parse_datetime(pub_date), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            return None
+        if direction not in (self.NEXT, self.PREVIOUS) or pub_date is None:
+            return None
+        return direction, pub_date, pk
+
+    def get_page(self, cursor=None):
+        """
+        Возвращает страницу по курсору;
+        при отсутствии или ошибке в курсоре - первую страницу.
+        """
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            return self._get_next_page(None)
+        direction, pub_date, pk = position
+        if direction == self.PREVIOUS:
+            return self._get_previous_page(pub_date, pk)
+        return self._get_next_page((pub_date, pk))
+
+    def seek(self, position=None, reverse=False):
+        """
+        per_page + 1 объектов после позиции position = (pub_date, id):
+        от новых к старым или, при reverse, от старых к новым.
+        Список объектов с собственным методом seek (лента подписок)
+        выбирает их сам.
+        """
+        if hasattr(self.object_list, "seek"):
+            return self.object_list.seek(self.per_page + 1, position, reverse)
+        queryset = seek_queryset(self.object_list, position, reverse)
+        return list(queryset[: self.per_page + 1])
+
+    def _get_next_page(self, position):
+        objects = self.seek(position)
+        next_cursor = previous_cursor = None
+        if len(objects) > self.per_page:
+            objects = objects[: self.per_page]
+            next_cursor = self.encode_cursor(objects[-1], self.NEXT)
+        if position is not None and objects:
+            previous_cursor = self.encode_cursor(objects[0], self.PREVIOUS)
+        return KeysetPage(objects, self, next_cursor, previous_cursor)
+
+    def _get_previous_page(self, pub_date, pk):
+        objects = self.seek((pub_date, pk), reverse=True)
+        previous_cursor = None
+        if len(objects) > self.per_page:
+            objects = objects[: self.per_page]
+            previous_cursor = self.encode_cursor(objects[-1], self.PREVIOUS)
+        objects.reverse()
+        next_cursor = None
+        if objects:
+            next_cursor = self.encode_cursor(objects[-1], self.NEXT)
+        return KeysetPage(objects, self, next_cursor, previous_cursor)
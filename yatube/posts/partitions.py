@@ -0,0 +1,207 @@
+import datetime
+import re
+import time
+import zlib
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Post, User, ViewPost
+
+TABLE = ViewPost._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+# Ключ advisory-блокировки записи просмотров
+LOCK_ID = zlib.crc32(TABLE.encode())
+
+
+def month_start(day, months=0):
+    """Первое число месяца, отстоящего от day на months месяцев."""
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+def is_partitioned():
+    """Секционирована ли таблица ViewPost (только PostgreSQL)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(%s)",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_partitions():
+    """Месячные секции ViewPost: {первое число месяца: имя таблицы}."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [name for name, in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            year, month = map(int, match.groups())
+            partitions[datetime.date(year, month, 1)] = name
+    return partitions
+
+
+def create_partitions(start, end):
+    """Создает недостающие месячные секции с месяца start по end."""
+    existing = get_partitions()
+    month, created = month_start(start), []
+    with connection.cursor() as cursor:
+        while month <= end:
+            if month not in existing:
+                name = f"{TABLE}_p{month:%Y%m}"
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" '
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    [month, month_start(month, 1)],
+                )
+                created.append(name)
+            month = month_start(month, 1)
+    return created
+
+
+def route_default_partition():
+    """
+    Переносит записи из секции по умолчанию, куда попадают просмотры
+    вне созданных месяцев, в месячные секции, создавая недостающие.
+    Иначе такие записи не удалялись бы вместе со старыми секциями,
+    а CREATE TABLE ... PARTITION OF для их месяца завершался бы ошибкой.
+    Возвращает число перенесенных записей.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'LOCK TABLE "{DEFAULT_PARTITION}" IN SHARE ROW EXCLUSIVE MODE'
+        )
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', date_of_viewing)::date "
+            f'FROM "{DEFAULT_PARTITION}"'
+        )
+        months = [month for month, in cursor.fetchall()]
+        if not months:
+            return 0
+        cursor.execute(
+            "CREATE TEMPORARY TABLE moved_views ON COMMIT DROP AS "
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" RETURNING *) '
+            "SELECT * FROM moved"
+        )
+        for month in months:
+            create_partitions(month, month)
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM moved_views')
+        return cursor.rowcount
+
+
+def lock_post_views():
+    """
+    Блокировка записи просмотров до конца транзакции, общая для всех
+    сбросов буфера: по расписанию, досрочного и из процесса сайта.
+    В секционированной таблице нет уникальных ограничений, и без нее
+    пересекающиеся сбросы записали бы один просмотр дважды.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_ID])
+
+
+def drop_partitions(before, archive=False):
+    """
+    Удаляет секции месяцев раньше before целиком, без построчного DELETE.
+    При archive секции только отсоединяются и остаются
+    отдельными таблицами для выгрузки в архив.
+    """
+    removed = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(get_partitions().items()):
+            if month_start(month, 1) > before:
+                continue
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            if not archive:
+                cursor.execute(f'DROP TABLE "{name}"')
+            removed.append(name)
+    return removed
+
+
+@transaction.atomic
+def convert_to_partitioned(months_ahead, keep_old=False):
+    """
+    Пересоздает таблицу ViewPost секционированной по месяцам
+    date_of_viewing и переносит в нее записи.
+    Уникальность просмотров в секционированной таблице обеспечивает
+    flush_post_views под блокировкой lock_post_views: ключ
+    секционирования обязан входить в каждый уникальный индекс,
+    поэтому ограничения unique_view_post и unique_anonymous_view_post
+    не переносятся. Записи вне созданных месяцев попадают в секцию
+    по умолчанию, откуда их переносит route_default_partition.
+    """
+    old_table = f"{TABLE}_unpartitioned"
+    sequence = f"{TABLE}_partitioned_id_seq"
+    with connection.cursor() as cursor:
+        # отложенные проверки внешних ключей мешают удалить старую таблицу
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{old_table}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{old_table}" INCLUDING DEFAULTS) '
+            "PARTITION BY RANGE (date_of_viewing)"
+        )
+        cursor.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{TABLE}".id')
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) "
+            f'FROM "{old_table}"',
+            [sequence],
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" '
+            f"ALTER COLUMN id SET DEFAULT nextval('{sequence}'), "
+            "ADD PRIMARY KEY (id, date_of_viewing), "
+            f'ADD FOREIGN KEY (post_id) REFERENCES "{Post._meta.db_table}" '
+            "(id) DEFERRABLE INITIALLY DEFERRED, "
+            f'ADD FOREIGN KEY (user_id) REFERENCES "{User._meta.db_table}" '
+            "(id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        for columns in (
+            "post_id, user_id",
+            "post_id, ip_address",
+            "user_id, date_of_viewing",
+        ):
+            cursor.execute(f'CREATE INDEX ON "{TABLE}" ({columns})')
+        cursor.execute(f'SELECT MIN(date_of_viewing) FROM "{old_table}"')
+        (first_view,) = cursor.fetchone()
+        today = timezone.localdate()
+        first_month = first_view.date() if first_view else today
+        create_partitions(first_month, month_start(today, months_ahead))
+        cursor.execute(
+            f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" '
+            "DEFAULT"
+        )
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{old_table}"')
+        if not keep_old:
+            cursor.execute(f'DROP TABLE "{old_table}"')
+
+
+def delete_views_before(before, batch_size, pause=0):
+    """
+    Удаляет просмотры раньше before пачками по batch_size записей,
+    каждая пачка - отдельная короткая транзакция.
+    Для БД без секционирования ViewPost.
+    """
+    deleted = 0
+    old_views = ViewPost.objects.filter(
+        date_of_viewing__lt=timezone.make_aware(
+            datetime.datetime.combine(before, datetime.time.min)
+        )
+    )
+    while ids := list(old_views.values_list("pk", flat=True)[:batch_size]):
+        deleted += ViewPost.objects.filter(pk__in=ids).delete()[0]
+        time.sleep(pause)
+    return deleted
@@ -0,0 +1,141 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+)
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast, Length
+
+from .models import Group, Post, User
+from .utils import UncachedValue, get_or_build_cache
+
+HEADLINE_OPTIONS = {
+    "start_sel": '<span style="background-color: red;">',
+    "stop_sel": "</span>",
+    "config": "russian",
+}
+
+
+def get_search_query(query):
+    if isinstance(query, SearchQuery):
+        return query
+    return SearchQuery(query, config="russian")
+
+
+def search_posts(query, queryset=None, *, group=None, author=None):
+    """
+    Полнотекстовый поиск постов по хранимому полю search_vector
+    с GIN-индексом; результаты упорядочены по убыванию релевантности.
+    Ранг приводится к double precision, чтобы значение курсора
+    пагинации точно совпадало со значением в БД.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    query = get_search_query(query)
+    queryset = queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
+    if group is not None:
+        queryset = queryset.filter(group=group)
+    if author is not None:
+        queryset = queryset.filter(author=author)
+    return queryset.order_by("-rank", "-pk")
+
+
+def count_by_group(query):
+    """
+    Количество найденных постов в каждой группе ({id группы: число},
+    None - посты без группы) одним запросом GROUP BY по совпадениям
+    из GIN-индекса search_vector.
+    """
+    return dict(
+        Post.objects.filter(search_vector=get_search_query(query))
+        .order_by()
+        .values_list("group")
+        .annotate(count=Count("pk"))
+    )
+
+
+def add_headlines(posts, query):
+    """
+    Добавляет постам подсвеченные фрагменты headline и bodyline.
+    ts_headline заново разбирает весь документ, поэтому фрагменты
+    строятся одним запросом только для переданных постов.
+    """
+    query = get_search_query(query)
+    headlines = {
+        pk: (headline, bodyline)
+        for pk, headline, bodyline in Post.objects.filter(
+            pk__in=[post.pk for post in posts]
+        )
+        .annotate(
+            headline=SearchHeadline("title", query, **HEADLINE_OPTIONS),
+            bodyline=SearchHeadline("text", query, **HEADLINE_OPTIONS),
+        )
+        .values_list("pk", "headline", "bodyline")
+    }
+    for post in posts:
+        post.headline, post.bodyline = headlines.get(post.pk, (None, None))
+    return posts
+
+
+def get_autocomplete_querysets(prefix):
+    """
+    Запросы подсказок по префиксу для каждого типа результатов.
+    istartswith выполняется как UPPER(поле) LIKE UPPER('префикс%'),
+    что обслуживают GIN-индексы pg_trgm по UPPER(поле), в том числе
+    для префиксов из двух символов.
+    """
+    return {
+        "posts": Post.objects.filter(title__istartswith=prefix)
+        .order_by("-views_count", "-pk")
+        .values("id", "title"),
+        "users": User.objects.filter(username__istartswith=prefix)
+        .order_by("-stats__subscribers_count", "username")
+        .values("id", "username"),
+        "groups": Group.objects.filter(title__istartswith=prefix)
+        .order_by(Length("title"), "title")
+        .values("id", "slug", "title"),
+    }
+
+
+def build_autocomplete(prefix, limit):
+    """
+    Подсказки каждого типа в пределах AUTOCOMPLETE_TIMEOUT мс на запрос;
+    тип, запрос которого не уложился в срок, возвращается пустым,
+    а неполный результат не кешируется.
+    """
+    results, timed_out = {}, False
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SET LOCAL statement_timeout = %s",
+                [settings.AUTOCOMPLETE_TIMEOUT],
+            )
+        for name, queryset in get_autocomplete_querysets(prefix).items():
+            try:
+                with transaction.atomic():
+                    results[name] = list(queryset[:limit])
+            except OperationalError:
+                results[name] = []
+                timed_out = True
+    if timed_out:
+        raise UncachedValue(results)
+    return results
+
+
+def autocomplete(prefix, limit=None):
+    """Подсказки поиска по префиксу с кешированием для каждого префикса."""
+    prefix = " ".join(prefix.lower().split())
+    limit = limit or settings.AUTOCOMPLETE_LIMIT
+    key = hashlib.md5(prefix.encode()).hexdigest()
+    return get_or_build_cache(
+        f"autocomplete:{limit}:{key}",
+        lambda: build_autocomplete(prefix, limit),
+        settings.AUTOCOMPLETE_CACHE_TIMEOUT,
+        stats="autocomplete_cache_stats",
+    )
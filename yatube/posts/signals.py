@@ -1,39 +1,151 @@
-from django.db.models.signals import post_delete, post_save
+from functools import partial
+
+from core.cache import get_redis_client
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import Signal, receiver
-from posts.models import Post, ViewPost
+from posts.models import Comment, Post, TimelineEntry
 from sorl.thumbnail import delete as thumbnail_delete
+from users.models import Follow, User, UserStats
 
-from .utils import cache_post_delete, get_client_ip
+from .fields import ImageStatus
+from .images import needs_renditions
+from .tasks import (
+    backfill_timeline,
+    fan_out_post,
+    flush_post_views,
+    generate_renditions,
+    process_image,
+)
+from .utils import (
+    buffer_post_view,
+    cache_post_delete,
+    get_client_ip,
+    local_post_views_flush_due,
+    pop_post_views,
+)
 
 
 @receiver(post_save, sender=Post)
-def post_save_post(instance, **kwargs) -> None:
+def post_save_post(instance, created, **kwargs) -> None:
     """
     Сигнал инвалидирует кеш модели Post;
-    Обновляет объект SearchVectorField.
+    Ставит в очередь конвертацию загруженной картинки
+    или создание ее миниатюр;
+    Рассылает новый пост в ленты подписчиков;
+    Обновляет счетчики автора.
     """
-    instance.update_search_vector()
     cache_post_delete(instance)
+    if instance.image and instance.image_status == ImageStatus.PENDING:
+        transaction.on_commit(
+            partial(process_image.delay, instance.pk, instance.image.name)
+        )
+    elif needs_renditions(instance.image):
+        transaction.on_commit(
+            partial(
+                generate_renditions.delay,
+                Post._meta.label,
+                instance.pk,
+                "image",
+                instance.image.name,
+            )
+        )
+    if created:
+        UserStats.objects.increment("posts_count", {instance.author_id: 1})
+        transaction.on_commit(partial(fan_out_post.delay, instance.pk))
+        return
+    old_author_id = instance.get_loaded_value("author_id")
+    if old_author_id is not None and old_author_id != instance.author_id:
+        for field_name, amount in (
+            ("posts_count", 1),
+            ("views_count", instance.views_count),
+        ):
+            UserStats.objects.increment(
+                field_name,
+                {instance.author_id: amount, old_author_id: -amount},
+            )
 
 
 @receiver(post_delete, sender=Post)
 def delete_image_on_model(instance, **kwargs):
     """
     Сигнал инвалидирует кеш модели Post;
-    Удаляет кеш-миниатюры thumbnail.
+    Удаляет кеш-миниатюры thumbnail;
+    Уменьшает счетчики автора.
     """
     cache_post_delete(instance)
+    UserStats.objects.increment("posts_count", {instance.author_id: -1})
+    UserStats.objects.increment(
+        "views_count", {instance.author_id: -instance.views_count}
+    )
     if instance.image:
         thumbnail_delete(instance.image)
         instance.image.delete(False)
 
 
+@receiver(post_save, sender=Comment)
+def comment_created(instance, created, **kwargs):
+    """Увеличивает счетчик комментариев поста."""
+    if created:
+        Post.objects.increment("comments_count", {instance.post_id: 1})
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(instance, **kwargs):
+    """
+    Комментарии удаляемого пользователя удаляются каскадом без вызова
+    Comment.delete, поэтому счетчики чужих постов уменьшаются заранее.
+    Обработчик post_delete для Comment отключил бы быстрое каскадное
+    удаление комментариев.
+    """
+    Comment.objects.filter(author=instance).exclude(
+        post__author=instance
+    ).delete()
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    """При подписке в ленту добавляются последние посты автора."""
+    if created:
+        transaction.on_commit(
+            partial(
+                backfill_timeline.delay, instance.user_id, instance.author_id
+            )
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    """При отписке из ленты удаляются посты автора."""
+    TimelineEntry.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id
+    ).delete()
+
+
 post_view_signal = Signal()
 
 
 @receiver(post_view_signal)
 def create_post_view(sender, instance, request, **kwargs):
-    """При просмотре страницы определенного создается запись в БД."""
-    ViewPost.objects.get_or_create(
-        post=instance, ip_address=get_client_ip(request)
+    """
+    При просмотре страницы определенного поста просмотр попадает в буфер;
+    в БД буфер записывает задача flush_post_views. Буфер в памяти
+    процесса (без Redis) недоступен воркеру Celery, поэтому процесс
+    сам извлекает из него просмотры и передает их задаче.
+    """
+    user = request.user
+    size = buffer_post_view(
+        instance.pk,
+        user.pk if user.is_authenticated else None,
+        get_client_ip(request),
     )
+    if get_redis_client() is None:
+        if local_post_views_flush_due(size):
+            while views := pop_post_views(settings.VIEWS_FLUSH_BATCH_SIZE):
+                transaction.on_commit(partial(flush_post_views.delay, views))
+    elif size >= settings.VIEWS_BUFFER_SIZE and cache.add(
+        "post_views_flush_lock", 1, settings.VIEWS_FLUSH_INTERVAL
+    ):
+        flush_post_views.delay()
@@ -1,28 +1,413 @@
-import contextlib
-import io
-import os
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
 
 from celery import shared_task
-from django.core.files.base import ContentFile
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
 from PIL import Image
+from sorl.thumbnail import delete as thumbnail_delete
+from users.models import Follow, UserStats
 
-from .models import Post
+from .fields import ImageStatus
+from .hyperloglog import record_unique_views
+from .images import convert_to_webp, save_renditions
+from .partitions import (
+    create_partitions,
+    delete_views_before,
+    drop_partitions,
+    is_partitioned,
+    lock_post_views,
+    month_start,
+    route_default_partition,
+)
+from .models import (
+    AuthorDailyViews,
+    Checkpoint,
+    Post,
+    PostDailyViews,
+    TimelineEntry,
+    ViewPost,
+    ViewSketch,
+)
+from .utils import is_pulled_author, pop_post_views
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_image(post_id, image_name):
+    """
+    Конвертирует загруженную картинку поста image_name в WEBP.
+    Пост обновляется запросом UPDATE без сигнала post_save и только
+    если картинка все еще ждет конвертации и не была заменена,
+    поэтому повторный запуск задачи ничего не меняет.
+    Возвращает пиковый объем памяти пикселей при конвертации в байтах.
+    """
+    pending = Post.objects.filter(
+        pk=post_id, image=image_name, image_status=ImageStatus.PENDING
+    )
+    if not pending.exists():
+        return None
+    try:
+        path, peak = convert_to_webp(image_name)
+    except (OSError, Image.DecompressionBombError) as error:
+        logger.warning("Image %s of post %s: %s", image_name, post_id, error)
+        pending.update(image_status=ImageStatus.FAILED)
+        return None
+    logger.info(
+        "Image %s of post %s converted, peak pixel memory %.1f MB",
+        image_name,
+        post_id,
+        peak / 2**20,
+    )
+    if pending.update(image=path, image_status=ImageStatus.READY):
+        # исходный файл и его миниатюры больше не нужны
+        thumbnail_delete(image_name)
+        save_renditions(Post, post_id, "image", path)
+    else:
+        default_storage.delete(path)
+    return peak
+
+
+@shared_task
+def generate_renditions(model_label, pk, field_name, image_name):
+    """Создает объявленные миниатюры картинки объекта."""
+    save_renditions(apps.get_model(model_label), pk, field_name, image_name)
+
+
+def add_timeline_entries(user_ids, author_id, posts):
+    """
+    Добавляет посты автора posts [(id, pub_date)] в ленты пользователей
+    user_ids пачками по TIMELINE_BATCH_SIZE записей.
+    """
+    entries = []
+    for user_id in user_ids:
+        entries.extend(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        )
+        if len(entries) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def get_followers(author_id):
+    """id подписчиков автора, читаемые из БД пачками."""
+    return (
+        Follow.objects.filter(author_id=author_id)
+        .values_list("user_id", flat=True)
+        .iterator(chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+
+def get_author_posts(author_id):
+    """
+    Все посты автора для ленты [(id, pub_date)] пачками
+    по TIMELINE_BATCH_SIZE, выбираемыми по ключу id.
+    """
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by("id")
+        .values_list("id", "pub_date")
+    )
+    size, last_id = settings.TIMELINE_BATCH_SIZE, 0
+    while batch := list(posts.filter(pk__gt=last_id)[:size]):
+        yield batch
+        last_id = batch[-1][0]
+
+
+@shared_task
+def fan_out_post(post_id):
+    """Рассылка нового поста в ленты подписчиков автора."""
+    post = (
+        Post.objects.filter(pk=post_id)
+        .values_list("author_id", "pub_date")
+        .first()
+    )
+    if post is None:
+        return
+    author_id, pub_date = post
+    if is_pulled_author(author_id):
+        return
+    add_timeline_entries(
+        get_followers(author_id), author_id, [(post_id, pub_date)]
+    )
+
+
+@shared_task
+def backfill_timeline(user_id, author_id):
+    """Добавление в ленту пользователя всех постов нового автора."""
+    if is_pulled_author(author_id):
+        return
+    for posts in get_author_posts(author_id):
+        add_timeline_entries([user_id], author_id, posts)
+
+
+@shared_task
+def update_pulled_authors():
+    """
+    Переключает авторов, число подписчиков которых перешло порог
+    TIMELINE_FANOUT_LIMIT, между рассылкой постов и чтением напрямую.
+    Пока автор читается напрямую, его новые посты и новые подписки
+    на него не попадают в материализованные ленты, поэтому при
+    возврате под порог все посты автора добавляются в ленты
+    всех подписчиков. Возвращает число таких авторов.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    UserStats.objects.filter(
+        subscribers_count__gt=limit, timeline_pulled=False
+    ).update(timeline_pulled=True)
+    returned = list(
+        UserStats.objects.filter(
+            subscribers_count__lte=limit, timeline_pulled=True
+        ).values_list("user_id", flat=True)
+    )
+    # новые посты рассылаются сразу после снятия отметки, а чтение
+    # напрямую продолжается, пока не сброшен список в кеше
+    UserStats.objects.filter(pk__in=returned).update(timeline_pulled=False)
+    for author_id in returned:
+        for posts in get_author_posts(author_id):
+            add_timeline_entries(get_followers(author_id), author_id, posts)
+    cache.delete("timeline_pulled_authors")
+    return len(returned)
 
 
 @shared_task
-def process_image(post_id, temp_image_path, image_name):
-    with contextlib.suppress(Post.DoesNotExist):
-        post = Post.objects.get(id=post_id)
+def refresh_page_cache(view_path, view_kwargs, query_string):
+    """Фоновая перестройка страницы кеша ленты."""
+    request = HttpRequest()
+    request.GET = QueryDict(query_string)
+    view = import_string(view_path)()
+    view.setup(request, **view_kwargs)
+    view.rebuild_page_cache()
 
-        img = Image.open(temp_image_path)
-        img_bytes = io.BytesIO()
-        img.save(fp=img_bytes, format="WEBP")
-        path = default_storage.save(
-            f"posts/{os.path.splitext(image_name)[0]}.webp",
-            ContentFile(content=img_bytes.getvalue()),
+
+@shared_task
+def flush_post_views(views=None):
+    """
+    Запись накопленных в буфере просмотров в БД пачками.
+    Буфер в памяти процесса сайта (без Redis) недоступен воркеру,
+    поэтому процесс передает его просмотры в аргументе views.
+    """
+    if views is not None:
+        write_post_views([tuple(view) for view in views])
+        return len(views)
+    flushed = 0
+    while views := pop_post_views(settings.VIEWS_FLUSH_BATCH_SIZE):
+        write_post_views(views)
+        flushed += len(views)
+    return flushed
+
+
+def write_post_views(views):
+    """
+    Записывает пачку просмотров (post_id, user_id, ip) в БД.
+    Повторные просмотры отсекаются по уже записанным в ViewPost; пачка
+    пишется под блокировкой lock_post_views, чтобы пересекающиеся
+    сбросы не записали один просмотр дважды.
+    При VIEWS_HLL уникальные просмотры считают скетчи HyperLogLog,
+    в ViewPost записываются только просмотры пользователей, а прирост
+    скетчей, включая анонимные просмотры, сразу добавляется в сводки
+    по дням.
+    """
+    with transaction.atomic():
+        lock_post_views()
+        day = timezone.localdate()
+        posts = Post.objects.filter(
+            pk__in={post_id for post_id, _, _ in views}
+        ).values_list("pk", "author_id")
+        post_authors = dict(posts)
+        if settings.VIEWS_HLL:
+            post_views = Counter(record_unique_views(views, post_authors, day))
+            new_views = get_new_post_views(
+                [view for view in views if view[1]], post_authors
+            )
+        else:
+            new_views = get_new_post_views(views, post_authors)
+            post_views = Counter(view.post_id for view in new_views.values())
+        author_views = Counter()
+        for post_id, count in post_views.items():
+            author_views[post_authors[post_id]] += count
+        ViewPost.objects.bulk_create(new_views.values(), ignore_conflicts=True)
+        Post.objects.increment("views_count", post_views)
+        UserStats.objects.increment("views_count", author_views)
+        if settings.VIEWS_HLL:
+            PostDailyViews.objects.add_views("post", day, post_views)
+            AuthorDailyViews.objects.add_views("author", day, author_views)
+
+
+def get_new_post_views(views, post_ids):
+    """
+    Просмотры из буфера, которых еще нет в БД, по ключу уникальности:
+    (пост, пользователь) или (пост, IP) для анонимных просмотров.
+    """
+    user_ids = set(
+        User.objects.filter(
+            pk__in={user_id for _, user_id, _ in views if user_id}
+        ).values_list("pk", flat=True)
+    )
+    new_views = {}
+    for post_id, user_id, ip_address in views:
+        if post_id not in post_ids:
+            continue
+        user_id = user_id if user_id in user_ids else None
+        ip_address = ip_address or None
+        new_views.setdefault(
+            (post_id, user_id, ip_address if user_id is None else None),
+            ViewPost(post_id=post_id, user_id=user_id, ip_address=ip_address),
         )
-        post.image.name = path
-        post.save()
+    existing = ViewPost.objects.filter(post_id__in=post_ids).filter(
+        Q(user_id__in=user_ids)
+        | Q(
+            user__isnull=True,
+            ip_address__in={ip for _, _, ip in new_views if ip},
+        )
+    )
+    for post_id, user_id, ip_address in existing.values_list(
+        "post_id", "user_id", "ip_address"
+    ):
+        new_views.pop(
+            (post_id, user_id, ip_address if user_id is None else None), None
+        )
+    return new_views
+
 
-        os.remove(temp_image_path)
+@shared_task
+def rollup_post_views(batch_size=None):
+    """
+    Сводка новых записей ViewPost в просмотры постов и авторов по дням.
+    Обрабатывает записи после отметки rollup_post_views пачками;
+    записи моложе VIEWS_ROLLUP_LAG ждут следующего запуска,
+    чтобы не пропустить еще не зафиксированные транзакции.
+    При VIEWS_HLL только сдвигает отметку.
+    """
+    batch_size = batch_size or settings.VIEWS_ROLLUP_BATCH_SIZE
+    checkpoint, _ = Checkpoint.objects.get_or_create(name="rollup_post_views")
+    upper = (
+        ViewPost.objects.filter(
+            date_of_viewing__lt=timezone.now()
+            - timedelta(seconds=settings.VIEWS_ROLLUP_LAG)
+        )
+        .order_by("-pk")
+        .values_list("pk", flat=True)
+        .first()
+    )
+    if settings.VIEWS_HLL:
+        # сводки пополняет flush_post_views, просмотры пользователей
+        # из ViewPost в них уже учтены
+        if upper is not None and checkpoint.position < upper:
+            checkpoint.position = upper
+            checkpoint.save(update_fields=("position", "updated_at"))
+        return 0
+    processed, offset = 0, batch_size - 1
+    while upper is not None and checkpoint.position < upper:
+        batch_end = list(
+            ViewPost.objects.filter(pk__gt=checkpoint.position, pk__lte=upper)
+            .order_by("pk")
+            .values_list("pk", flat=True)[offset:batch_size]
+        )
+        last_id = batch_end[0] if batch_end else upper
+        rows = ViewPost.objects.filter(
+            pk__gt=checkpoint.position, pk__lte=last_id
+        )
+        post_days = rows.values_list(
+            "post_id", TruncDate("date_of_viewing")
+        ).distinct()
+        with transaction.atomic():
+            rollup_view_days(post_days)
+            checkpoint.position = last_id
+            checkpoint.save(update_fields=("position", "updated_at"))
+        processed += rows.count()
+    return processed
+
+
+def rollup_view_days(post_days):
+    """
+    Пересчитывает сводки за пары (post_id, day) целиком по ViewPost,
+    поэтому повторная обработка тех же записей безопасна.
+    """
+    post_ids_by_day = defaultdict(set)
+    for post_id, day in post_days:
+        post_ids_by_day[day].add(post_id)
+    for day, post_ids in post_ids_by_day.items():
+        post_views = (
+            ViewPost.objects.filter(
+                post_id__in=post_ids, date_of_viewing__date=day
+            )
+            .values_list("post_id")
+            .annotate(views=Count("id"))
+        )
+        PostDailyViews.objects.bulk_create(
+            (
+                PostDailyViews(post_id=post_id, day=day, views=views)
+                for post_id, views in post_views
+            ),
+            update_conflicts=True,
+            unique_fields=("post", "day"),
+            update_fields=("views",),
+        )
+        author_ids = Post.objects.filter(pk__in=post_ids).values("author_id")
+        author_views = (
+            PostDailyViews.objects.filter(
+                post__author_id__in=author_ids, day=day
+            )
+            .values_list("post__author_id")
+            .annotate(views=Sum("views"))
+        )
+        AuthorDailyViews.objects.bulk_create(
+            (
+                AuthorDailyViews(author_id=author_id, day=day, views=views)
+                for author_id, views in author_views
+            ),
+            update_conflicts=True,
+            unique_fields=("author", "day"),
+            update_fields=("views",),
+        )
+
+
+@shared_task
+def prune_post_views(months=None, batch_size=None, pause=0, archive=None):
+    """
+    Хранение ViewPost не дольше VIEWS_RETENTION_MONTHS месяцев.
+    Секционированная таблица получает секции на VIEWS_PARTITIONS_AHEAD
+    месяцев вперед, записи из секции по умолчанию переносятся
+    в месячные, а старые секции удаляются целиком; иначе старые
+    записи удаляются пачками. Заодно удаляет истекшие скетчи
+    ViewSketch. Возвращает число удаленных секций или записей.
+    """
+    ViewSketch.objects.filter(expires_at__lt=timezone.now()).delete()
+    today = timezone.localdate()
+    partitioned = is_partitioned()
+    if partitioned:
+        route_default_partition()
+        create_partitions(
+            today, month_start(today, settings.VIEWS_PARTITIONS_AHEAD)
+        )
+    months = months or settings.VIEWS_RETENTION_MONTHS
+    if not months:
+        return 0
+    before = month_start(today, -months)
+    if partitioned:
+        if archive is None:
+            archive = settings.VIEWS_RETENTION_ARCHIVE
+        return len(drop_partitions(before, archive))
+    return delete_views_before(
+        before, batch_size or settings.VIEWS_PRUNE_BATCH_SIZE, pause
+    )
@@ -3,6 +3,7 @@ import tempfile
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
@@ -10,6 +11,7 @@ from django.utils import timezone
 from users.models import Follow
 
 from ..models import Comment, Group, Post
+from ..utils import get_cache_versions
 from .utils import check_fields_of_post
 
 User = get_user_model()
@@ -74,6 +76,9 @@ class TestPost(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self) -> None:
+        cache.clear()
+
     def test_posts_count_on_index_page(self):
         """Проверка количества постов на странице."""
         for reverse_name in self.reverse_names:
@@ -107,6 +112,66 @@ class TestPost(TestCase):
                     ),
                 )
 
+    @override_settings(KEYSET_PAGINATION=True)
+    def test_keyset_pagination(self):
+        """Проверка постраничного вывода по курсору."""
+        for reverse_name in self.reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.reader_client.get(reverse_name)
+                page = response.context.get("page_obj")
+                self.assertEqual(list(page), list(self.posts))
+                self.assertFalse(page.has_previous())
+                response = self.reader_client.get(
+                    reverse_name, {"cursor": page.next_cursor}
+                )
+                page = response.context.get("page_obj")
+                self.assertEqual(len(page), 1)
+                self.assertFalse(page.has_next())
+                response = self.reader_client.get(
+                    reverse_name, {"cursor": page.previous_cursor}
+                )
+                page = response.context.get("page_obj")
+                self.assertEqual(
+                    list(page),
+                    list(self.posts),
+                    "\nКурсор предыдущей страницы должен вернуть первую.",
+                )
+
+    def test_cache_stores_page_ids(self):
+        """Проверка что в кеше ленты хранятся только id постов страницы."""
+        index_url = reverse("posts:index")
+        self.reader_client.get(index_url)
+        version = get_cache_versions("feed")[0]
+        entry = cache.get(f"index_cache:{version}:page:1")
+        self.assertEqual(
+            entry["value"]["ids"],
+            [post.id for post in self.posts],
+            "\nВ кеше страницы должны храниться упорядоченные id постов.",
+        )
+        response = self.reader_client.get(index_url)
+        page = response.context.get("page_obj")
+        self.assertEqual(list(page), list(self.posts))
+        self.assertEqual(page.paginator.count, settings.PAGE_SIZE + 1)
+
+    def test_post_save_invalidates_feed_caches(self):
+        """Проверка инвалидации кеша лент при сохранении поста."""
+        for reverse_name in self.reverse_names:
+            self.reader_client.get(reverse_name)
+        post = Post.objects.create(
+            title="New post",
+            text=self.TEXT_POST,
+            author=self.author,
+            group=self.group,
+        )
+        for reverse_name in self.reverse_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.reader_client.get(reverse_name)
+                self.assertEqual(
+                    response.context.get("posts")[0],
+                    post,
+                    f"\nНовый пост должен появиться по адресу {reverse_name}",
+                )
+
     def test_page_show_correct_context(self):
         """Проверка контекста."""
         for reverse_name in self.reverse_names:
@@ -1,16 +1,91 @@
-from io import BytesIO
+import base64
+import binascii
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
+import redis
+from api.fields import decode_base64_file
+from core.cache import CompressedRedisSerializer, get_redis_client
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Value
+from django.db.models.expressions import RawSQL
+from django.test import (
+    Client,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from PIL import Image
-from users.models import Follow
+from django.utils import timezone
+from PIL import ExifTags, Image
+from rest_framework.test import APIClient
+from users.models import Follow, UserStats
 
-from ..models import Comment, Group, Post
+from ..hyperloglog import HyperLogLog, count_author_unique_views
+from ..images import convert_to_webp, decode_master, open_image
+from ..models import (
+    AuthorDailyViews,
+    Checkpoint,
+    Comment,
+    Group,
+    Post,
+    PostDailyViews,
+    TimelineEntry,
+    ViewPost,
+)
+from ..paginators import KeysetPaginator
+from ..partitions import (
+    DEFAULT_PARTITION,
+    is_partitioned,
+    route_default_partition,
+)
+from ..search import autocomplete
+from ..tasks import (
+    flush_post_views,
+    process_image,
+    prune_post_views,
+    rollup_post_views,
+    update_pulled_authors,
+)
+from ..utils import (
+    buffer_post_view,
+    get_cache_stats,
+    get_or_build_cache,
+    set_cache_entry,
+)
 from .utils import check_post
 
 User = get_user_model()
 
+# Прирост пикового RSS процесса при декодировании картинки, в КБ
+MEASURE_DECODE = """
+import resource, sys
+import django
+django.setup()
+from django.test.utils import override_settings
+from posts.images import decode_master, open_image
+with override_settings(IMAGE_MAX_EDGE=500, IMAGE_MAX_DECODE_PIXELS=1_000_000):
+    image = open_image(sys.argv[1])
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    decode_master(image)
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+"""
+
 
 class TestPostCreation(TestCase):
     """Тестирование создание постов."""
@@ -65,6 +140,207 @@ class TestPostCreation(TestCase):
         )
 
 
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR),
+    CELERY_TASK_ALWAYS_EAGER=True,
+    CELERY_TASK_EAGER_PROPAGATES=True,
+)
+class TestImageIngest(TestCase):
+    """Тестирование фоновой конвертации картинок в WEBP."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_upload_converted_after_commit(self):
+        """Тестирование сохранения оригинала и конвертации задачей."""
+        client = Client()
+        client.force_login(self.author)
+        file = BytesIO()
+        Image.new("RGB", (100, 100)).save(file, "jpeg")
+        file.name = "test.jpg"
+        file.seek(0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            client.post(
+                reverse("posts:post_create"),
+                data={"title": "Фото", "text": "Текст", "image": file},
+            )
+        post = Post.objects.get()
+        original = post.image.name
+        self.assertTrue(original.endswith(".jpg"))
+        self.assertEqual(post.image_status, "pending")
+        for callback in callbacks:
+            callback()
+        post.refresh_from_db()
+        self.assertTrue(post.image.name.endswith(".webp"))
+        self.assertEqual(post.image_status, "ready")
+        self.assertFalse(default_storage.exists(original))
+        self.assertEqual(
+            set(post.image_renditions),
+            set(settings.IMAGE_RENDITIONS["posts.Post.image"]),
+        )
+        feed = post.image_renditions["feed"]
+        self.assertEqual((feed["width"], feed["height"]), (500, 300))
+        response = self.client.get(reverse("posts:index"))
+        self.assertContains(response, f'src="{feed["url"]}"')
+        updated_at = post.updated_at
+        process_image(post.pk, original)
+        post.refresh_from_db()
+        self.assertEqual(post.updated_at, updated_at)
+        self.assertTrue(default_storage.exists(post.image.name))
+        Post.objects.update(image_renditions={})
+        call_command("build_renditions", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.image_renditions["feed"], feed)
+
+    @override_settings(IMAGE_MAX_EDGE=100)
+    def test_master_downscaled(self):
+        """Тестирование уменьшения картинки и удаления метаданных."""
+        file = BytesIO()
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        exif[ExifTags.Base.Make] = "Camera"
+        Image.new("RGB", (400, 200)).save(file, "jpeg", exif=exif)
+        default_storage.save("posts/big.jpg", file)
+        path, peak = convert_to_webp("posts/big.jpg")
+        with default_storage.open(path) as stored, Image.open(stored) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn("exif", image.info)
+        self.assertLess(peak, 400 * 200 * 4)
+
+    def test_decode_memory_measured(self):
+        """
+        Тестирование памяти декодирования по замеру пикового RSS
+        отдельного процесса: большой JPEG декодируется уменьшенным,
+        PNG того же размера отклоняется до декодирования.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for image_format in ("jpeg", "png"):
+                paths[image_format] = os.path.join(directory, image_format)
+                Image.new("RGB", (4000, 4000)).save(
+                    paths[image_format], image_format
+                )
+            result = subprocess.run(
+                [sys.executable, "-c", MEASURE_DECODE, paths["jpeg"]],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            with override_settings(
+                IMAGE_MAX_EDGE=500, IMAGE_MAX_DECODE_PIXELS=1_000_000
+            ):
+                with self.assertRaises(Image.DecompressionBombError):
+                    decode_master(open_image(paths["png"]))
+        self.assertLess(
+            int(result.stdout) * 1024,
+            16 * 2**20,
+            "\nJPEG 4000x4000 (64 МБ пикселей) не должен "
+            "декодироваться целиком.",
+        )
+
+    @override_settings(IMAGE_MAX_PIXELS=5000)
+    def test_too_many_pixels_rejected(self):
+        """Тестирование отказа в загрузке слишком большой картинки."""
+        client = Client()
+        client.force_login(self.author)
+        file = BytesIO()
+        Image.new("RGB", (100, 100)).save(file, "png")
+        file.name = "big.png"
+        file.seek(0)
+        response = client.post(
+            reverse("posts:post_create"),
+            data={"title": "Фото", "text": "Текст", "image": file},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Post.objects.exists())
+        default_storage.save("posts/big.png", file)
+        with self.assertRaises(Image.DecompressionBombError):
+            convert_to_webp("posts/big.png")
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10)
+    def test_api_upload(self):
+        """Тестирование загрузки картинки через API в base64 и multipart."""
+        client = APIClient()
+        client.force_authenticate(self.author)
+        file = BytesIO()
+        Image.new("RGB", (100, 100)).save(file, "png")
+        data = (
+            "data:image/png;base64,"
+            + base64.b64encode(file.getvalue()).decode()
+        )
+        response = client.post(
+            "/api/v1/posts/",
+            {"title": "Фото", "text": "Текст", "image": data},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith(".png"))
+        with post.image.open() as stored:
+            self.assertEqual(stored.read(), file.getvalue())
+        response = client.post(
+            "/api/v1/posts/",
+            {"title": "Фото", "text": "Текст", "image": data + "!"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=100):
+            response = client.post(
+                "/api/v1/posts/",
+                {"title": "Фото", "text": "Текст", "image": data},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        file.name = "upload.png"
+        file.seek(0)
+        response = client.post(
+            "/api/v1/posts/upload/",
+            {"title": "Файл", "text": "Текст", "image": file},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_decode_wrapped_base64(self):
+        """Тестирование декодирования base64 с переносами строк кусками."""
+        content = bytes(range(256)) * 3
+        data = "prefix" + base64.encodebytes(content).decode()
+        with mock.patch("api.fields.BASE64_CHUNK_SIZE", 10):
+            file = decode_base64_file(data, 6, "file.bin", "text/plain")
+            self.assertEqual(file.read(), content)
+            with self.assertRaises(binascii.Error):
+                decode_base64_file(data + "QQ", 6, "file.bin", "text/plain")
+
+    def test_convert_command(self):
+        """Тестирование пакетной конвертации старых картинок."""
+        for name in ("posts/old.png", "users/avatar.png"):
+            file = BytesIO()
+            Image.new("RGB", (60, 60)).save(file, "png")
+            default_storage.save(name, file)
+        post = Post.objects.create(author=self.author, text="Текст")
+        Post.objects.update(image="posts/old.png")
+        User.objects.update(avatar="users/avatar.png")
+        output = StringIO()
+        call_command("convert_to_webp", "--dry-run", stdout=output)
+        self.assertIn("posts/old.png", output.getvalue())
+        self.assertTrue(default_storage.exists("posts/old.png"))
+        call_command("convert_to_webp", "--workers", "2", stdout=StringIO())
+        post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(post.image.name, "posts/old.webp")
+        self.assertEqual(self.author.avatar.name, "users/avatar.webp")
+        self.assertFalse(default_storage.exists("posts/old.png"))
+        self.assertIn("small", self.author.avatar_renditions)
+        self.assertFalse(Checkpoint.objects.exists())
+
+
 class TestPostEditDelete(TestCase):
     """Тестирование удаление и редактирование постов."""
 
@@ -327,3 +603,848 @@ class TestFollow(TestCase):
             followers_count_after + 1,
             "\nПользователь может отписаться от автора.",
         )
+
+
+@override_settings(
+    CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True
+)
+class TestTimeline(TestCase):
+    """Тестирование ленты подписок."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.reader = User.objects.create(username="Reader")
+        cls.post = Post.objects.create(
+            author=cls.author, title="Old post", text="Testing"
+        )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.url_follow_index = reverse("posts:follow_index")
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def get_feed(self):
+        response = self.reader_client.get(self.url_follow_index)
+        return list(response.context.get("posts"))
+
+    def test_subscribe_backfills_timeline(self):
+        """Тестирование добавления постов автора в ленту при подписке."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(author=self.author, user=self.reader)
+        self.assertEqual(
+            self.get_feed(),
+            [self.post],
+            "\nПосле подписки в ленте должны появиться посты автора.",
+        )
+
+    @override_settings(TIMELINE_BATCH_SIZE=2)
+    def test_backfill_and_rebuild_whole_history(self):
+        """Тестирование добавления в ленту всех постов автора пачками."""
+        posts = [
+            Post.objects.create(author=self.author, text=f"Пост {number}")
+            for number in range(4)
+        ]
+        posts.append(self.post)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(author=self.author, user=self.reader)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+        TimelineEntry.objects.filter(post=posts[0]).delete()
+        Checkpoint.objects.create(
+            name="rebuild_timelines", position=self.reader.pk - 1
+        )
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(user=self.reader).values_list(
+                    "post", flat=True
+                )
+            ),
+            {post.pk for post in posts},
+        )
+        self.assertFalse(Checkpoint.objects.exists())
+
+    def test_new_post_fan_out_to_followers(self):
+        """Тестирование рассылки нового поста в ленты подписчиков."""
+        Follow.objects.create(author=self.author, user=self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                author=self.author, title="New post", text="Testing"
+            )
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists(),
+            "\nНовый пост должен попасть в ленту подписчика.",
+        )
+        self.assertIn(post, self.get_feed())
+
+    def test_unsubscribe_trims_timeline(self):
+        """Тестирование удаления постов автора из ленты при отписке."""
+        with self.captureOnCommitCallbacks(execute=True):
+            follow = Follow.objects.create(
+                author=self.author, user=self.reader
+            )
+        follow.delete()
+        self.assertEqual(
+            self.get_feed(),
+            [],
+            "\nПосле отписки посты автора должны пропасть из ленты.",
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_posts_of_popular_author_pulled_on_read(self):
+        """Тестирование чтения постов популярного автора без рассылки."""
+        Follow.objects.create(author=self.author, user=self.reader)
+        update_pulled_authors()
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, text="Новый")
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed(), [post, self.post])
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            self.assertEqual(update_pulled_authors(), 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(),
+            2,
+            "\nПосле возврата автора к рассылке его посты "
+            "должны попасть в ленты подписчиков.",
+        )
+        self.assertEqual(self.get_feed(), [post, self.post])
+
+    def test_feed_pages_merge_pulled_authors(self):
+        """Тестирование страниц ленты с постами популярного автора."""
+        popular = User.objects.create(username="Popular")
+        for author in (self.author, popular):
+            with self.captureOnCommitCallbacks(execute=True):
+                Follow.objects.create(author=author, user=self.reader)
+        UserStats.objects.filter(user=popular).update(timeline_pulled=True)
+        posts = [self.post]
+        for number in range(4):
+            with self.captureOnCommitCallbacks(execute=True):
+                posts.append(
+                    Post.objects.create(
+                        author=(self.author, popular)[number % 2],
+                        text=f"Пост {number}",
+                    )
+                )
+        posts.reverse()
+        timeline = Post.objects.get_timeline(self.reader, [popular.pk])
+        self.assertEqual(timeline.count(), 5)
+        self.assertEqual(timeline[0:3], posts[:3])
+        self.assertEqual(timeline[3:5], posts[3:])
+        paginator = KeysetPaginator(timeline, 2)
+        page = paginator.get_page()
+        self.assertEqual(list(page), posts[:2])
+        page = paginator.get_page(page.next_cursor)
+        self.assertEqual(list(page), posts[2:4])
+        page = paginator.get_page(page.previous_cursor)
+        self.assertEqual(list(page), posts[:2])
+
+
+class TestApiPagination(TestCase):
+    """Тестирование курсорной пагинации API."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f"Пост {number}")
+            for number in range(settings.PAGE_SIZE + 2)
+        ]
+        cls.posts.reverse()
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.posts[0], author=cls.author, text=f"Ответ {number}"
+            )
+            for number in range(settings.PAGE_SIZE + 1)
+        ]
+        cls.comments.reverse()
+        cls.groups = [
+            Group.objects.create(
+                title=f"Группа {number}",
+                slug=f"group-{number}",
+                description="Описание",
+            )
+            for number in range(settings.PAGE_SIZE + 1)
+        ]
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def get_ids(self, response):
+        return [item["id"] for item in response.data["results"]]
+
+    def test_posts_cursor_without_count(self):
+        """Тестирование страниц постов по курсору без COUNT."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/posts/")
+        self.assertFalse(
+            [q for q in queries if "COUNT(" in q["sql"].upper()],
+            "\nКурсорная пагинация не должна считать все посты.",
+        )
+        self.assertNotIn("count", response.data)
+        ids = [post.id for post in self.posts]
+        page_size = settings.PAGE_SIZE
+        self.assertEqual(self.get_ids(response), ids[:page_size])
+        next_url = response.data["next"]
+        self.assertEqual(list(parse_qs(urlsplit(next_url).query)), ["cursor"])
+        response = self.client.get(next_url)
+        self.assertEqual(self.get_ids(response), ids[page_size:])
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_posts_offset_legacy(self):
+        """Тестирование прежней пагинации по параметру offset."""
+        page_size = settings.PAGE_SIZE
+        response = self.client.get(
+            "/api/v1/posts/", {"offset": page_size, "limit": 5}
+        )
+        self.assertEqual(response.data["count"], len(self.posts))
+        self.assertEqual(
+            self.get_ids(response),
+            [post.id for post in self.posts[page_size:]],
+        )
+        response = self.client.get("/api/v1/posts/", {"offset": 1})
+        self.assertEqual(
+            self.get_ids(response),
+            [post.id for post in self.posts[1:][:page_size]],
+            "\nБез limit страница ограничена размером по умолчанию.",
+        )
+
+    def test_comments_and_groups_cursor(self):
+        """Тестирование курсорной пагинации комментариев и групп."""
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.get(f"/api/v1/posts/{self.posts[0].id}/comments/")
+        self.assertNotIn("count", response.data)
+        self.assertEqual(
+            self.get_ids(response),
+            [comment.id for comment in self.comments[: settings.PAGE_SIZE]],
+        )
+        response = client.get(response.data["next"])
+        self.assertEqual(self.get_ids(response), [self.comments[-1].id])
+        response = client.get("/api/v1/groups/")
+        self.assertNotIn("count", response.data)
+        self.assertEqual(
+            self.get_ids(response),
+            [group.id for group in self.groups[: settings.PAGE_SIZE]],
+        )
+        response = client.get(response.data["next"])
+        self.assertEqual(self.get_ids(response), [self.groups[-1].id])
+
+
+class TestPostViews(TestCase):
+    """Тестирование буферизованного учета просмотров."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.reader = User.objects.create(username="Reader")
+        cls.post = Post.objects.create(author=cls.author, text="Testing")
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.url_detail = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.id}
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        flush_post_views()
+
+    def test_views_written_on_flush(self):
+        """Тестирование записи просмотров в БД только при сбросе буфера."""
+        for client in (self.client, self.client, self.reader_client):
+            client.get(self.url_detail)
+        self.assertFalse(
+            ViewPost.objects.exists(),
+            "\nПросмотр страницы не должен писать в БД.",
+        )
+        flush_post_views()
+        self.assertEqual(ViewPost.objects.count(), 2)
+        self.assertTrue(
+            ViewPost.objects.filter(post=self.post, user=self.reader).exists()
+        )
+
+    def test_repeated_views_ignored(self):
+        """Тестирование отсечения повторных просмотров при сбросе."""
+        self.client.get(self.url_detail)
+        flush_post_views()
+        self.client.get(self.url_detail)
+        flush_post_views()
+        self.assertEqual(ViewPost.objects.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 1)
+
+    @override_settings(
+        VIEWS_FLUSH_INTERVAL=0,
+        CELERY_TASK_ALWAYS_EAGER=True,
+        CELERY_TASK_EAGER_PROPAGATES=True,
+    )
+    def test_local_buffer_flushed_by_task(self):
+        """Тестирование передачи буфера в памяти задаче после коммита."""
+        if get_redis_client() is not None:
+            self.skipTest("буфер просмотров хранится в Redis")
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.get(self.url_detail)
+        self.assertEqual(
+            ViewPost.objects.count(),
+            0,
+            "\nПроцесс сайта не должен писать просмотры в БД сам.",
+        )
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(ViewPost.objects.count(), 1)
+
+    @override_settings(VIEWS_HLL=True)
+    def test_unique_views_counted_by_sketches(self):
+        """Тестирование подсчета уникальных просмотров скетчами."""
+        Post.objects.filter(pk=self.post.pk).update(views_count=100)
+        for client in (self.client, self.client, self.reader_client):
+            client.get(self.url_detail)
+        flush_post_views()
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.post.views_count,
+            102,
+            "\nСчетчик должен расти на прирост оценки скетча.",
+        )
+        cache.clear()
+        self.client.get(self.url_detail)
+        flush_post_views()
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.post.views_count,
+            102,
+            "\nСкетчи не должны теряться при очистке кеша.",
+        )
+        self.assertEqual(
+            list(ViewPost.objects.values_list("user", flat=True)),
+            [self.reader.id],
+            "\nАнонимные просмотры не должны записываться в ViewPost.",
+        )
+        today = timezone.localdate()
+        self.assertEqual(
+            count_author_unique_views(self.author.id, today, today), 2
+        )
+        with override_settings(VIEWS_ROLLUP_LAG=0):
+            rollup_post_views()
+        self.assertEqual(
+            PostDailyViews.objects.get(post=self.post, day=today).views,
+            2,
+            "\nСводка по дням должна учитывать анонимные просмотры.",
+        )
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.get(f"/api/v1/users/{self.author.id}/stats/")
+        self.assertEqual(response.data["total"], 2)
+        self.assertEqual(response.data["unique_visitors"], 2)
+
+
+class TestViewRollups(TestCase):
+    """Тестирование сводок просмотров по дням."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.reader = User.objects.create(username="Reader")
+        cls.post = Post.objects.create(author=cls.author, text="Testing")
+        cls.yesterday = timezone.now() - timedelta(days=1)
+
+    def add_view(self, ip_address):
+        view = ViewPost.objects.create(post=self.post, ip_address=ip_address)
+        ViewPost.objects.filter(pk=view.pk).update(
+            date_of_viewing=self.yesterday
+        )
+
+    def test_incremental_rollup(self):
+        """Тестирование сводки только новых записей после отметки."""
+        self.add_view("10.0.0.1")
+        self.add_view("10.0.0.2")
+        self.assertEqual(rollup_post_views(batch_size=1), 2)
+        self.add_view("10.0.0.3")
+        self.assertEqual(rollup_post_views(), 1)
+        day = timezone.localdate(self.yesterday)
+        self.assertEqual(
+            PostDailyViews.objects.get(post=self.post, day=day).views, 3
+        )
+        self.assertEqual(
+            AuthorDailyViews.objects.get(author=self.author, day=day).views,
+            3,
+        )
+
+    def test_stats_api_reads_rollups(self):
+        """Тестирование статистики автора в API."""
+        day = timezone.localdate(self.yesterday)
+        AuthorDailyViews.objects.create(author=self.author, day=day, views=5)
+        PostDailyViews.objects.create(post=self.post, day=day, views=5)
+        client = APIClient()
+        url = f"/api/v1/users/{self.author.id}/stats/"
+        client.force_authenticate(self.reader)
+        self.assertEqual(client.get(url).status_code, 403)
+        client.force_authenticate(self.author)
+        response = client.get(url)
+        self.assertEqual(response.data["total"], 5)
+        self.assertEqual(response.data["top_posts"][0]["id"], self.post.id)
+
+
+class TestViewRetention(TestCase):
+    """Тестирование срока хранения просмотров."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.post = Post.objects.create(author=cls.author, text="Testing")
+
+    def add_view(self, ip_address, days_ago):
+        view = ViewPost.objects.create(post=self.post, ip_address=ip_address)
+        ViewPost.objects.filter(pk=view.pk).update(
+            date_of_viewing=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def test_batched_delete(self):
+        """Тестирование удаления старых просмотров пачками."""
+        for number in range(3):
+            self.add_view(f"10.0.0.{number}", 100)
+        self.add_view("10.0.1.1", 0)
+        self.assertEqual(prune_post_views(months=2, batch_size=2), 3)
+        self.assertEqual(ViewPost.objects.count(), 1)
+
+    def test_partitioned_table(self):
+        """Тестирование секционирования и удаления старых секций."""
+        self.add_view("10.0.0.1", 100)
+        self.add_view("10.0.0.2", 0)
+        call_command("partition_views", stdout=StringIO())
+        self.assertTrue(is_partitioned())
+        self.assertEqual(ViewPost.objects.count(), 2)
+        ViewPost.objects.create(post=self.post, ip_address="10.0.0.3")
+        self.assertEqual(prune_post_views(months=2), 1)
+        self.assertEqual(ViewPost.objects.count(), 2)
+
+    def test_default_partition_routed(self):
+        """Тестирование переноса записей из секции по умолчанию."""
+        self.add_view("10.0.0.1", 0)
+        call_command("partition_views", stdout=StringIO())
+        self.add_view("10.0.0.2", 200)
+        self.add_view("10.0.0.3", -400)
+        self.assertEqual(route_default_partition(), 2)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{DEFAULT_PARTITION}"')
+            self.assertEqual(cursor.fetchone(), (0,))
+        self.assertEqual(prune_post_views(months=2), 1)
+        self.assertEqual(
+            set(ViewPost.objects.values_list("ip_address", flat=True)),
+            {"10.0.0.1", "10.0.0.3"},
+        )
+
+    def test_partitioned_flush_skips_recorded_views(self):
+        """Тестирование сброса повторных просмотров без уникальности в БД."""
+        call_command("partition_views", stdout=StringIO())
+        for _ in range(2):
+            buffer_post_view(self.post.id, None, "10.0.0.1")
+            flush_post_views()
+        self.assertEqual(ViewPost.objects.count(), 1)
+
+
+class TestSearchVector(TestCase):
+    """Тестирование поискового вектора, заполняемого триггером БД."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+
+    def get_vector(self, post):
+        return Post.objects.values_list("search_vector", flat=True).get(
+            pk=post.pk
+        )
+
+    def test_vector_weighted_and_kept(self):
+        """Тестирование весов и пересчета только при изменении текста."""
+        post = Post.objects.create(
+            author=self.author, title="Кошки", text="Собаки"
+        )
+        self.assertEqual(self.get_vector(post), "'кошк':1A 'собак':2B")
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        updates = [
+            query
+            for query in queries
+            if query["sql"].startswith('UPDATE "posts_post"')
+        ]
+        self.assertEqual(len(updates), 1, "\nВектор пишется тем же UPDATE.")
+        Post.objects.filter(pk=post.pk).update(
+            search_vector=SearchVector(Value("кошки"), config="simple")
+        )
+        post.save()
+        self.assertEqual(
+            self.get_vector(post),
+            "'кошки':1",
+            "\nБез изменения текста вектор не пересчитывается.",
+        )
+        post.text = "Птицы"
+        post.save()
+        self.assertEqual(self.get_vector(post), "'кошк':1A 'птиц':2B")
+
+    def test_reindex_resumes_from_checkpoint(self):
+        """Тестирование переиндексации с сохраненной отметки."""
+        posts = [
+            Post.objects.create(author=self.author, title="Кошки", text=text)
+            for text in ("Собаки", "Птицы", "Рыбы")
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(
+                "ALTER TABLE posts_post "
+                "DISABLE TRIGGER posts_post_search_vector_update"
+            )
+            Post.objects.update(search_vector=None)
+            cursor.execute(
+                "ALTER TABLE posts_post "
+                "ENABLE TRIGGER posts_post_search_vector_update"
+            )
+        Checkpoint.objects.create(name="reindex_search", position=posts[0].pk)
+        call_command("reindex_search", "--batch-size", "1", stdout=StringIO())
+        self.assertIsNone(self.get_vector(posts[0]))
+        self.assertEqual(self.get_vector(posts[2]), "'кошк':1A 'рыб':2B")
+        self.assertFalse(
+            Checkpoint.objects.filter(name="reindex_search").exists()
+        )
+
+
+class TestSearch(TestCase):
+    """Тестирование поиска постов."""
+
+    def setUp(self):
+        cache.clear()
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        Post.objects.bulk_create(
+            Post(author=cls.author, title=f"Кошки {n}", text="Про кошек")
+            for n in range(settings.PAGE_SIZE + 2)
+        )
+        Post.objects.create(author=cls.author, title="Собаки", text="Лают")
+
+    def test_headlines_only_for_page(self):
+        """Тестирование подсветки только для постов страницы."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("posts:search"), {"search": "кошки"}
+            )
+        posts = response.context["posts"]
+        self.assertEqual(
+            response.context["paginator"].count, settings.PAGE_SIZE + 2
+        )
+        self.assertEqual(len(posts), settings.PAGE_SIZE)
+        self.assertIn(
+            '<span style="background-color: red;">', posts[0].headline
+        )
+        headline_queries = [
+            query["sql"] for query in queries if "ts_headline" in query["sql"]
+        ]
+        self.assertEqual(len(headline_queries), 1)
+        self.assertIn('"posts_post"."id" IN', headline_queries[0])
+
+    def test_cache_by_normalized_query(self):
+        """Тестирование кеша поиска по нормализованному запросу."""
+        url = reverse("posts:search")
+        self.client.get(url, {"search": "кошки собаки"})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"search": "Собакам КОШКАМ"})
+        self.assertEqual(get_cache_stats("search_cache_stats")["hit"], 1)
+        self.assertFalse(
+            any("COUNT" in query["sql"] for query in queries),
+            "\nПовторный поиск выполняется без подсчета результатов.",
+        )
+        self.assertEqual(len(response.context["posts"]), 0)
+        Post.objects.create(author=self.author, title="Кошки", text="Собаки")
+        response = self.client.get(url, {"search": "собаки кошки"})
+        self.assertEqual(len(response.context["posts"]), 1)
+        self.assertEqual(get_cache_stats("search_cache_stats")["miss"], 2)
+
+    def test_cache_without_query_and_stop_words(self):
+        """Тестирование разных ключей кеша без запроса и для стоп-слов."""
+        url = reverse("posts:search")
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["posts"]), settings.PAGE_SIZE)
+        response = self.client.get(url, {"search": "и"})
+        self.assertEqual(len(response.context["posts"]), 0)
+        self.assertEqual(get_cache_stats("search_cache_stats")["miss"], 2)
+
+    def test_api_search(self):
+        """Тестирование поиска в API с фильтром и курсором."""
+        group = Group.objects.create(title="Группа", slug="group")
+        Post.objects.filter(title__in=["Кошки 0", "Кошки 1"]).update(
+            group=group
+        )
+        client = APIClient()
+        url = "/api/v1/posts/search/"
+        self.assertEqual(client.get(url).status_code, 400)
+        response = client.get(url, {"q": "кошки", "limit": 3})
+        ids = [post["id"] for post in response.data["results"]]
+        next_url = response.data["next"]
+        while next_url:
+            response = client.get(next_url)
+            ids += [post["id"] for post in response.data["results"]]
+            next_url = response.data["next"]
+        self.assertEqual(len(ids), settings.PAGE_SIZE + 2)
+        self.assertEqual(len(set(ids)), len(ids))
+        response = client.get(url, {"q": "кошки", "group": group.id})
+        results = response.data["results"]
+        self.assertEqual(len(results), 2)
+        self.assertIn("background-color", results[0]["headline"])
+
+    def test_group_facets(self):
+        """Тестирование количества найденных постов по группам."""
+        group = Group.objects.create(title="Кошачьи", slug="cats")
+        Post.objects.filter(title__in=["Кошки 0", "Кошки 1"]).update(
+            group=group
+        )
+        url = reverse("posts:search")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"search": "кошки"})
+        facets = {group.pk: 2, None: settings.PAGE_SIZE}
+        self.assertEqual(response.context["group_facets"], facets)
+        self.assertEqual(
+            sum("GROUP BY" in query["sql"] for query in queries), 1
+        )
+        self.assertContains(response, "group=cats")
+        response = self.client.get(url, {"search": "кошки", "group": "cats"})
+        self.assertEqual(len(response.context["posts"]), 2)
+        self.assertEqual(response.context["group_facets"], facets)
+        response = self.client.get(url, {"search": "кошки"})
+        self.assertEqual(get_cache_stats("search_cache_stats")["hit"], 1)
+        self.assertEqual(response.context["group_facets"], facets)
+
+    def test_autocomplete(self):
+        """Тестирование подсказок поиска по префиксу."""
+        group = Group.objects.create(title="Котики", slug="cats")
+        client = APIClient()
+        url = "/api/v1/autocomplete/"
+        self.assertEqual(client.get(url, {"q": "к"}).status_code, 400)
+        response = client.get(url, {"q": "КО", "limit": 3})
+        self.assertEqual(len(response.data["posts"]), 3)
+        self.assertEqual(response.data["groups"][0]["slug"], group.slug)
+        self.assertEqual(response.data["users"], [])
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url, {"q": "ко", "limit": 3})
+        self.assertEqual(len(queries), 0, "\nПодсказки берутся из кеша.")
+        response = client.get(url, {"q": "aut"})
+        self.assertEqual(response.data["users"][0]["username"], "Author")
+
+    def test_autocomplete_timeout_not_cached(self):
+        """Тестирование подсказок без кеша после таймаута запроса."""
+        querysets = {
+            "posts": Post.objects.annotate(
+                sleep=RawSQL("pg_sleep(1)", ())
+            ).values("id", "sleep"),
+            "groups": Group.objects.values("id"),
+        }
+        with mock.patch(
+            "posts.search.get_autocomplete_querysets", return_value=querysets
+        ) as get_querysets:
+            for _ in range(2):
+                self.assertEqual(autocomplete("ко")["posts"], [])
+        self.assertEqual(
+            get_querysets.call_count,
+            2,
+            "\nНеполные подсказки не должны кешироваться.",
+        )
+
+
+class TestHyperLogLog(TestCase):
+    """Тестирование скетча HyperLogLog."""
+
+    def test_count_and_merge(self):
+        """Тестирование оценки количества и объединения скетчей."""
+        first, second = HyperLogLog(), HyperLogLog()
+        for value in range(10000):
+            first.add(value)
+            second.add(value + 5000)
+        self.assertAlmostEqual(first.count(), 10000, delta=300)
+        restored = HyperLogLog.from_bytes(bytes(first))
+        self.assertAlmostEqual(
+            restored.merge(second).count(), 15000, delta=450
+        )
+
+
+class TestPostCounters(TestCase):
+    """Тестирование хранимых счетчиков поста."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.post = Post.objects.create(author=cls.author, text="Testing")
+
+    def test_comments_count_follows_comments(self):
+        """Тестирование изменения счетчика при добавлении и удалении."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text="Comment"
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_comments_count_on_bulk_and_cascade_delete(self):
+        """Тестирование счетчика при удалении пачкой и каскадом."""
+        reader = User.objects.create(username="Reader")
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=author, text="Comment")
+            for author in (self.author, reader, reader)
+        )
+        Post.objects.update(comments_count=3)
+        Comment.objects.filter(author=self.author).delete()
+        reader.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.author, text="Comment")
+            for _ in range(20)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.post.delete()
+        self.assertFalse(
+            any(
+                query["sql"].startswith('UPDATE "posts_post"')
+                for query in queries
+            ),
+            "\nКаскадное удаление комментариев не обновляет пост.",
+        )
+
+    def test_reconcile_command_fixes_drift(self):
+        """Тестирование исправления расхождений командой."""
+        Comment.objects.create(
+            post=self.post, author=self.author, text="Comment"
+        )
+        ViewPost.objects.create(post=self.post, ip_address="127.0.0.1")
+        Post.objects.update(views_count=5, comments_count=0)
+        call_command("reconcile_post_counters", stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.views_count, self.post.comments_count), (1, 1)
+        )
+
+
+class TestUserStats(TestCase):
+    """Тестирование счетчиков пользователя."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = User.objects.create(username="Author")
+        cls.reader = User.objects.create(username="Reader")
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_posts_count_follows_posts(self):
+        """Тестирование счетчика постов автора."""
+        post = Post.objects.create(author=self.author, text="Testing")
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        post.author = self.reader
+        post.save()
+        self.assertEqual(self.get_stats(self.author).posts_count, 0)
+        self.assertEqual(self.get_stats(self.reader).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.get_stats(self.reader).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Тестирование счетчиков подписок и подписчиков."""
+        follow = Follow.objects.create(author=self.author, user=self.reader)
+        self.assertEqual(self.get_stats(self.author).subscribers_count, 1)
+        self.assertEqual(self.get_stats(self.reader).subscriptions_count, 1)
+        follow.delete()
+        self.assertEqual(self.get_stats(self.author).subscribers_count, 0)
+        self.assertEqual(self.get_stats(self.reader).subscriptions_count, 0)
+
+    def test_views_count_of_author(self):
+        """Тестирование счетчика просмотров постов автора."""
+        post = Post.objects.create(author=self.author, text="Testing")
+        self.client.get(
+            reverse("posts:post_detail", kwargs={"post_id": post.id})
+        )
+        flush_post_views()
+        self.assertEqual(self.get_stats(self.author).views_count, 1)
+
+
+class TestRedisCache(SimpleTestCase):
+    """Тестирование сериализатора и клиента кеша Redis без сервера."""
+
+    def test_serializer_round_trip(self):
+        """Тестирование сжатия крупных значений и целых чисел."""
+        serializer = CompressedRedisSerializer()
+        small = {"ids": [1, 2, 3]}
+        data = serializer.dumps(small)
+        self.assertNotEqual(data[:1], serializer.marker)
+        self.assertEqual(serializer.loads(data), small)
+        large = {"ids": list(range(1000))}
+        data = serializer.dumps(large)
+        self.assertEqual(data[:1], serializer.marker)
+        self.assertLess(len(data), len(pickle.dumps(large)))
+        self.assertEqual(serializer.loads(data), large)
+        self.assertEqual(serializer.dumps(5), 5)
+        # Redis возвращает счетчики incr байтами
+        self.assertEqual(serializer.loads(b"5"), 5)
+
+    def test_redis_client(self):
+        """Тестирование клиента Redis только для кеша в Redis."""
+        locmem = "django.core.cache.backends.locmem.LocMemCache"
+        with self.settings(CACHES={"default": {"BACKEND": locmem}}):
+            self.assertIsNone(get_redis_client())
+        redis_cache = {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://localhost:1/0",
+        }
+        with self.settings(CACHES={"default": redis_cache}):
+            self.assertIsInstance(get_redis_client(), redis.Redis)
+
+
+class TestCacheStampede(TestCase):
+    """Тестирование защиты кеша от одновременной перестройки."""
+
+    KEY = "test_cache"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.builder = mock.Mock(return_value="new")
+
+    def test_miss_builds_and_caches_value(self):
+        """Тестирование построения значения при промахе."""
+        for _ in range(2):
+            value = get_or_build_cache(self.KEY, self.builder, 60)
+        self.assertEqual(value, "new")
+        self.builder.assert_called_once()
+        self.assertEqual(get_cache_stats()["miss"], 1)
+        self.assertEqual(get_cache_stats()["hit"], 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Тестирование отдачи устаревшего значения во время перестройки."""
+        set_cache_entry(self.KEY, "old", 0, stale_timeout=60)
+        cache.add(f"{self.KEY}:lock", 1)
+        value = get_or_build_cache(self.KEY, self.builder, 60)
+        self.assertEqual(value, "old")
+        self.builder.assert_not_called()
+        self.assertEqual(get_cache_stats()["stale"], 1)
+
+    def test_background_refresh(self):
+        """Тестирование фонового обновления устаревшего значения."""
+        set_cache_entry(self.KEY, "old", 0, stale_timeout=60)
+        refresh = mock.Mock()
+        for _ in range(2):
+            value = get_or_build_cache(
+                self.KEY, self.builder, 60, refresh=refresh
+            )
+        self.assertEqual(value, "old")
+        refresh.assert_called_once()
+        self.builder.assert_not_called()
+
+    @mock.patch("posts.utils.CACHE_LOCK_WAIT", 0)
+    def test_lock_wait_timeout_builds_without_caching(self):
+        """Тестирование построения значения после ожидания блокировки."""
+        cache.add(f"{self.KEY}:lock", 1)
+        value = get_or_build_cache(self.KEY, self.builder, 60)
+        self.assertEqual(value, "new")
+        self.assertIsNone(cache.get(self.KEY))
+        self.assertEqual(get_cache_stats()["lock_timeout"], 1)
@@ -1,16 +1,38 @@
-from django.contrib.postgres.search import (
-    SearchHeadline,
-    SearchQuery,
-    SearchRank,
-    SearchVector,
-)
+import hashlib
+import math
+import random
+import threading
+import time
+
+from core.cache import get_redis_client
+from django.conf import settings
 from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db import connection
+from users.models import UserStats
 
-from .models import Post
+from .models import Group
 
 LIMIT_POSTS = 8
 
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 1
+CACHE_LOCK_POLL_INTERVAL = 0.05
+CACHE_STATS = (
+    "hit",
+    "miss",
+    "stale",
+    "early_refresh",
+    "background_refresh",
+    "lock_wait",
+    "lock_timeout",
+)
+
+POST_VIEWS_BUFFER_KEY = "post_views_buffer"
+_post_views_buffer = set()
+_post_views_lock = threading.Lock()
+_post_views_flushed_at = time.monotonic()
+
 
 def get_page_context(queryset, request):
     """Паджинатор"""
@@ -24,32 +46,19 @@ def get_page_context(queryset, request):
     }
 
 
-def q_search(query):
-    """Полнотекстовый поиск постов по полям 'title' и 'text'."""
-    vector = SearchVector("title", "text")
-    query = SearchQuery(query)
-    result = (
-        Post.objects.annotate(rank=SearchRank(vector, query))
-        .filter(rank__gt=0)
-        .order_by("-rank")
-    )
-    result = result.annotate(
-        headline=SearchHeadline(
-            "title",
-            query,
-            start_sel='<span style="background-color: red;">',
-            stop_sel="</span>",
-        )
-    )
-    result = result.annotate(
-        bodyline=SearchHeadline(
-            "text",
-            query,
-            start_sel='<span style="background-color: red;">',
-            stop_sel="</span>",
+def normalize_search_query(query):
+    """
+    Ключ поискового запроса для кеша: отсортированные лексемы
+    запроса после приведения к нижнему регистру и стемминга.
+    Запросы, которые отличаются регистром, формой слов или порядком
+    слов, дают один ключ и одинаковый результат поиска.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tsvector_to_array(to_tsvector('russian', %s))", [query]
         )
-    )
-    return result
+        (lexemes,) = cursor.fetchone()
+    return hashlib.md5(" ".join(sorted(lexemes)).encode()).hexdigest()
 
 
 def get_client_ip(request):
@@ -64,18 +73,261 @@ def get_client_ip(request):
     )
 
 
+def buffer_post_view(post_id, user_id, ip_address):
+    """
+    Добавляет просмотр поста в буфер и возвращает размер буфера.
+    Буфер - множество Redis, общее для всех процессов, без Redis -
+    множество в памяти процесса; повторные просмотры схлопываются.
+    """
+    member = f"{post_id}|{user_id or ''}|{ip_address or ''}"
+    client = get_redis_client()
+    if client is None:
+        with _post_views_lock:
+            _post_views_buffer.add(member)
+            return len(_post_views_buffer)
+    key = cache.make_key(POST_VIEWS_BUFFER_KEY)
+    pipeline = client.pipeline()
+    pipeline.sadd(key, member)
+    pipeline.scard(key)
+    return pipeline.execute()[-1]
+
+
+def local_post_views_flush_due(size):
+    """
+    Пора ли сбросить буфер просмотров в памяти процесса. Этот буфер
+    видит только сам процесс, а не воркер Celery, поэтому процесс
+    передает его просмотры задаче: при VIEWS_BUFFER_SIZE просмотрах
+    и не реже раза в VIEWS_FLUSH_INTERVAL секунд.
+    """
+    return (
+        size >= settings.VIEWS_BUFFER_SIZE
+        or time.monotonic() - _post_views_flushed_at
+        >= settings.VIEWS_FLUSH_INTERVAL
+    )
+
+
+def pop_post_views(count):
+    """Извлекает из буфера до count просмотров (post_id, user_id, ip)."""
+    global _post_views_flushed_at
+    client = get_redis_client()
+    if client is None:
+        with _post_views_lock:
+            _post_views_flushed_at = time.monotonic()
+            members = [
+                _post_views_buffer.pop()
+                for _ in range(min(count, len(_post_views_buffer)))
+            ]
+    else:
+        key = cache.make_key(POST_VIEWS_BUFFER_KEY)
+        members = [member.decode() for member in client.spop(key, count) or ()]
+    views = []
+    for member in members:
+        post_id, user_id, ip_address = member.split("|", 2)
+        views.append(
+            (int(post_id), int(user_id) if user_id else None, ip_address)
+        )
+    return views
+
+
 def set_get_cache(query, cache_name, cache_time):
     """Функция для управлением кешированием."""
-    data = cache.get(cache_name)
-    if not data:
-        data = query
-        cache.set(cache_name, data, cache_time)
-    return data
+    return get_or_build_cache(cache_name, lambda: query, cache_time)
+
+
+def incr_cache_stat(name, stats="cache_stats"):
+    """Увеличивает счетчик пути обращения к кешу из группы stats."""
+    key = f"{stats}_{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_cache_stats(stats="cache_stats"):
+    """Значения счетчиков обращений к кешу из группы stats."""
+    keys = {f"{stats}_{name}": name for name in CACHE_STATS}
+    values = cache.get_many(keys)
+    return {name: values.get(key, 0) for key, name in keys.items()}
+
+
+def reset_cache_stats(stats="cache_stats"):
+    """Обнуляет счетчики обращений к кешу из группы stats."""
+    cache.delete_many([f"{stats}_{name}" for name in CACHE_STATS])
+
+
+def set_cache_entry(key, value, timeout, stale_timeout=0, delta=0):
+    """
+    Сохраняет значение вместе со сроком свежести и временем построения;
+    запись живет в кеше еще stale_timeout секунд после устаревания.
+    """
+    entry = {"value": value, "expires": time.time() + timeout, "delta": delta}
+    cache.set(key, entry, timeout + stale_timeout)
+    cache.delete(f"{key}:lock")
+
+
+class UncachedValue(Exception):
+    """
+    Значение, которое builder отдает без сохранения в кеш,
+    например неполный результат после таймаута запроса.
+    """
+
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+
+def build_cache_entry(key, builder, timeout, stale_timeout=0):
+    """Строит значение и сохраняет его в кеш, снимая блокировку."""
+    try:
+        start = time.monotonic()
+        value = builder()
+        delta = time.monotonic() - start
+    except UncachedValue as uncached:
+        cache.delete(f"{key}:lock")
+        return uncached.value
+    except BaseException:
+        cache.delete(f"{key}:lock")
+        raise
+    set_cache_entry(key, value, timeout, stale_timeout, delta)
+    return value
+
+
+def is_early_refresh(entry, beta=1.0):
+    """
+    Вероятностное досрочное обновление (XFetch): чем ближе конец срока
+    и чем дольше строится значение, тем вероятнее перестройка.
+    """
+    gap = entry["delta"] * beta * math.log(1 - random.random())
+    return time.time() - gap >= entry["expires"]
+
+
+def get_or_build_cache(
+    key,
+    builder,
+    timeout,
+    *,
+    stale_timeout=0,
+    early_refresh=False,
+    refresh=None,
+    stats="cache_stats",
+):
+    """
+    Чтение из кеша с защитой от одновременной перестройки.
+    Значение строит только запрос, получивший блокировку key:lock,
+    остальные получают устаревшее значение или ждут построения.
+    Если передан refresh, устаревшее значение отдается сразу,
+    а перестройка поручается refresh (например, задаче Celery).
+    Значение, переданное builder через UncachedValue, не кешируется.
+    Пути обращения считаются в группе счетчиков stats.
+    """
+    entry = cache.get(key)
+    lock_key = f"{key}:lock"
+    if entry is not None:
+        fresh = time.time() < entry["expires"]
+        if fresh and not (early_refresh and is_early_refresh(entry)):
+            incr_cache_stat("hit", stats)
+            return entry["value"]
+        if not cache.add(lock_key, 1, CACHE_LOCK_TIMEOUT):
+            incr_cache_stat("stale", stats)
+            return entry["value"]
+        if refresh is not None:
+            incr_cache_stat("background_refresh", stats)
+            refresh()
+            return entry["value"]
+        incr_cache_stat("early_refresh" if fresh else "miss", stats)
+        return build_cache_entry(key, builder, timeout, stale_timeout)
+    if cache.add(lock_key, 1, CACHE_LOCK_TIMEOUT):
+        incr_cache_stat("miss", stats)
+        return build_cache_entry(key, builder, timeout, stale_timeout)
+    incr_cache_stat("lock_wait", stats)
+    deadline = time.monotonic() + CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(CACHE_LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["value"]
+    incr_cache_stat("lock_timeout", stats)
+    try:
+        return builder()
+    except UncachedValue as uncached:
+        return uncached.value
+
+
+def get_cache_versions(*namespaces):
+    """
+    Текущие поколения кеша для пространств имен.
+    Поколение входит в ключ кеша, поэтому для инвалидации
+    достаточно увеличить его, не удаляя сами записи.
+    """
+    keys = [f"cache_version_{namespace}" for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_cache_versions(*namespaces):
+    """Инвалидация кеша пространств имен сменой поколения."""
+    for namespace in namespaces:
+        key = f"cache_version_{namespace}"
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
 
 
 def cache_post_delete(post):
-    """Функция для ивалидации кеша модели Post."""
-    cache.delete("index_cache")
-    follows = post.author.following.all()
-    for follow in follows:
-        cache.delete(f"post_follow_cache_{follow.user_id}")
+    """
+    Функция для ивалидации кеша модели Post;
+    Сменяет поколения общей ленты, поиска, автора и групп поста
+    (текущей и прежней при переносе поста в другую группу).
+    """
+    group_ids = {post.group_id, post.get_loaded_value("group_id")}
+    group_slugs = Group.objects.filter(pk__in=group_ids - {None}).values_list(
+        "slug", flat=True
+    )
+    bump_cache_versions(
+        "feed",
+        "search",
+        f"author_{post.author_id}",
+        *(f"group_{slug}" for slug in group_slugs),
+    )
+
+
+def get_pulled_authors():
+    """
+    Авторы, отмеченные задачей update_pulled_authors: у них подписчиков
+    больше TIMELINE_FANOUT_LIMIT. Их посты не рассылаются по лентам,
+    а подмешиваются при чтении.
+    """
+    authors = cache.get("timeline_pulled_authors")
+    if authors is None:
+        authors = list(
+            UserStats.objects.filter(timeline_pulled=True).values_list(
+                "user_id", flat=True
+            )
+        )
+        cache.set("timeline_pulled_authors", authors, 900)
+    return authors
+
+
+def is_pulled_author(author_id):
+    """Читаются ли посты автора напрямую; проверяется по БД, без кеша."""
+    return UserStats.objects.filter(
+        user_id=author_id, timeline_pulled=True
+    ).exists()
+
+
+def get_timeline_pulled_authors(user):
+    """Авторы из подписок пользователя, посты которых читаются напрямую."""
+    pulled_authors = get_pulled_authors()
+    if not pulled_authors:
+        return []
+    return list(
+        user.follower.filter(author_id__in=pulled_authors).values_list(
+            "author_id", flat=True
+        )
+    )
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -29,7 +30,9 @@ from .mixins import (
     SearchMixin,
 )
 from .models import Comment, Post
+from .search import count_by_group
 from .signals import post_view_signal
+from .utils import get_timeline_pulled_authors, normalize_search_query
 
 User = get_user_model()
 
@@ -37,16 +40,51 @@ User = get_user_model()
 class PostListView(CacheMixin, PostMixinListView):
     """Класс представления списка постов."""
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        cache_name = "index_cache"
-        return self.get_cache(queryset, cache_name, self.cache_timeout)
+    cache_name = "index_cache"
+    cache_namespaces = ("feed",)
+
 
+class SearchPost(SearchMixin, CacheMixin, PostMixinListView):
+    """
+    Класс представления для поиска постов.
+    Кешируются id найденных постов каждой страницы под ключом
+    нормализованного запроса; подсветка строится после чтения кеша.
+    Вместе со страницей кешируется число совпадений по группам.
+    """
 
-class SearchPost(SearchMixin, PostMixinListView):
-    """Класс представления для поиска постов."""
+    keyset_pagination = False
+    cache_name = "search_cache"
+    cache_namespaces = ("search",)
+    cache_stats = "search_cache_stats"
+    cache_timeout = settings.SEARCH_CACHE_TIMEOUT
+    cache_stale_timeout = 0
+    cache_background_refresh = False
+
+    group_facets = None
+
+    def get_cache_name(self) -> str:
+        # без запроса выводятся все посты, а запрос из одних стоп-слов
+        # не находит ничего, хотя его лексемы тоже пусты
+        search = self.request.GET.get("search", "")
+        query = normalize_search_query(search) if search else "all"
+        group = self.request.GET.get("group", "")
+        return f"{self.cache_name}:{query}:{group}"
+
+    def get_page_state(self, page) -> dict:
+        state = super().get_page_state(page)
+        if self.search_query is not None:
+            self.group_facets = count_by_group(self.search_query)
+            state["facets"] = self.group_facets
+        return state
+
+    def restore_page(self, queryset, page_size, state):
+        self.group_facets = state.get("facets")
+        return super().restore_page(queryset, page_size, state)
 
-    pass
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["group_facets"] = self.group_facets
+        return context
 
 
 class PostDetailView(View):
@@ -65,7 +103,7 @@ class PostDetail(DetailView):
     """Класс представления определенного поста."""
 
     model = Post
-    queryset = Post.objects.select_related("author", "group")
+    queryset = Post.objects.select_related("author__stats", "group")
     template_name = "posts/post_detail.html"
     pk_url_kwarg = "post_id"
 
@@ -83,8 +121,6 @@ class PostDetail(DetailView):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        queryset = queryset.get_views_count()
-        queryset = queryset.get_count_posts_of_author()
         if self.request.user.is_authenticated:
             queryset = queryset.annotate(
                 is_subscribed=Exists(
@@ -150,19 +186,22 @@ class GroupPostListView(CacheMixin, PostMixinListView):
 
     def get_queryset(self):
         slug = self.kwargs.get("slug")
-        queryset = super().get_queryset().filter(group__slug=slug)
-        cache_name = f"posts_of_group_cache_{slug}"
-        return self.get_cache(queryset, cache_name, self.cache_timeout)
+        return super().get_queryset().filter(group__slug=slug)
+
+    def get_cache_name(self) -> str:
+        return f"posts_of_group_cache_{self.kwargs.get('slug')}"
+
+    def get_cache_namespaces(self):
+        return (f"group_{self.kwargs.get('slug')}",)
 
 
-class PostFollowListView(LoginRequiredMixin, CacheMixin, PostMixinListView):
+class PostFollowListView(LoginRequiredMixin, PostMixinListView):
     """Класс представления постов избранных авторов."""
 
     def get_queryset(self):
         user = self.request.user
-        queryset = super().get_queryset().filter(author__following__user=user)
-        cache_name = f"post_follow_cache_{user.id}"
-        return self.get_cache(queryset, cache_name, self.cache_timeout)
+        pulled_authors = get_timeline_pulled_authors(user)
+        return super().get_queryset().get_timeline(user, pulled_authors)
 
 
 class AddDeleteFollowing(LoginRequiredMixin, View):
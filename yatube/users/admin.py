@@ -5,7 +5,6 @@ from django import forms
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db.models import Count
 from django.http import HttpResponse
 from django.urls import reverse
 from django.utils.html import format_html
@@ -56,27 +55,22 @@ class UserAdmin(admin.ModelAdmin):
     save_as = True
     ordering = ("username", "first_name", "last_name")
     actions = ["export_to_csv"]
-
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.prefetch_related("posts", "posts__view_posts", "following")
-        qs = qs.annotate(views_count=Count("posts__view_posts"))
-        return qs
+    list_select_related = ("stats",)
 
     @admin.display(description="Кол-во просмотров постов автора")
     def get_views_count(self, obj):
         """Количество просмотров постов автора."""
-        return obj.views_count
+        return obj.stats.views_count
 
     @admin.display(description="Кол-во подписчиков")
     def get_subscribers_count(self, obj):
         """Количество подписчиков."""
-        return obj.following.count()
+        return obj.stats.subscribers_count
 
     @admin.display(description="Posts")
     def view_posts_link(self, obj):
         """Ссылка на список публикаций автора."""
-        count = obj.posts.count()
+        count = obj.stats.posts_count
         url = (
             reverse("admin:posts_post_changelist")
             + f"?author__id__exact={obj.id}"
@@ -0,0 +1,106 @@
+# Generated by Django 5.1 on 2026-10-18 19:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def aggregate_subquery(queryset, field, aggregate):
+    values = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(value=aggregate)
+        .values("value")
+    )
+    return Coalesce(Subquery(values), Value(0))
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    UserStats = apps.get_model("users", "UserStats")
+    Follow = apps.get_model("users", "Follow")
+    Post = apps.get_model("posts", "Post")
+    users = User.objects.annotate(
+        stat_posts=aggregate_subquery(Post.objects, "author", Count("id")),
+        stat_subscribers=aggregate_subquery(Follow.objects, "author", Count("id")),
+        stat_subscriptions=aggregate_subquery(Follow.objects, "user", Count("id")),
+        stat_views=aggregate_subquery(Post.objects, "author", Sum("views_count")),
+    ).values_list(
+        "pk",
+        "stat_posts",
+        "stat_subscribers",
+        "stat_subscriptions",
+        "stat_views",
+    )
+    UserStats.objects.bulk_create(
+        (
+            UserStats(
+                user_id=user_id,
+                posts_count=posts,
+                subscribers_count=subscribers,
+                subscriptions_count=subscriptions,
+                views_count=views,
+            )
+            for user_id, posts, subscribers, subscriptions, views in users
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0006_follow_created_at"),
+        ("posts", "0005_post_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="пользователь",
+                    ),
+                ),
+                (
+                    "posts_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Кол-во постов"
+                    ),
+                ),
+                (
+                    "subscribers_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Кол-во подписчиков"
+                    ),
+                ),
+                (
+                    "subscriptions_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Кол-во подписок"
+                    ),
+                ),
+                (
+                    "views_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Кол-во просмотров постов"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика пользователя",
+                "verbose_name_plural": "Статистика пользователей",
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
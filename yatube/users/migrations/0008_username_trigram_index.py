@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    """
+    Триграммный GIN-индекс по UPPER(username) для подсказок поиска.
+    Требует расширения pg_trgm; без него подсказки работают без индекса.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS users_user_username_trgm_idx "
+            "ON users_user USING gin (UPPER(username) gin_trgm_ops)"
+        )
+
+
+def drop_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP INDEX IF EXISTS users_user_username_trgm_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0007_userstats"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
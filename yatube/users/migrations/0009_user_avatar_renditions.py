@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-18 20:10
+
+import posts.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0008_username_trigram_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="avatar_renditions",
+            field=models.JSONField(
+                default=dict, editable=False, verbose_name="Миниатюры фотографии"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=posts.fields.RenditionsImageField(
+                blank=True,
+                null=True,
+                renditions_field="avatar_renditions",
+                upload_to="users/%Y/%m/%d",
+                verbose_name="Фотография",
+            ),
+        ),
+    ]
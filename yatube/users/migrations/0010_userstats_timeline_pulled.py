@@ -0,0 +1,30 @@
+# Generated by Django 5.1 on 2026-10-18 20:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_authors(apps, schema_editor):
+    """Авторы, которые и раньше читались напрямую, остаются такими."""
+    UserStats = apps.get_model("users", "UserStats")
+    UserStats.objects.filter(
+        subscribers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(timeline_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0009_user_avatar_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userstats",
+            name="timeline_pulled",
+            field=models.BooleanField(
+                default=False, verbose_name="Посты подмешиваются в ленты при чтении"
+            ),
+        ),
+        migrations.RunPython(mark_pulled_authors, migrations.RunPython.noop),
+    ]
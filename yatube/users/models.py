@@ -1,6 +1,8 @@
+from core.querysets import CounterQuerySetMixin
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from posts.fields import RenditionsImageField
 
 
 class UserQueryset(models.QuerySet):
@@ -13,17 +15,6 @@ class UserQueryset(models.QuerySet):
             )
         )
 
-    def get_posts_count(self):
-        return self.annotate(posts_count=models.Count("posts"))
-
-    def get_subscriptions_count(self):
-        """Количество подписок."""
-        return self.annotate(subscriptions_count=models.Count("follower"))
-
-    def get_subscribers_count(self):
-        """Количество подписчиков."""
-        return self.annotate(subscribers_count=models.Count("following"))
-
 
 class CustomUserManager(UserManager):
     def get_queryset(self) -> models.QuerySet:
@@ -32,21 +23,20 @@ class CustomUserManager(UserManager):
     def get_is_subscribed(self):
         return self.get_queryset().get_is_subscribed()
 
-    def get_subscriptions_count(self):
-        return self.get_queryset().get_subscriptions_count()
-
-    def get_subscribers_count(self):
-        return self.get_queryset().get_subscribers_count()
-
-    def get_posts_count(self):
-        return self.get_queryset().get_posts_count()
-
 
 class User(AbstractUser):
     """Кастомная модель User."""
 
-    avatar = models.ImageField(
-        "Фотография", upload_to="users/%Y/%m/%d", null=True, blank=True
+    avatar = RenditionsImageField(
+        "Фотография",
+        upload_to="users/%Y/%m/%d",
+        null=True,
+        blank=True,
+        renditions_field="avatar_renditions",
+    )
+    # {имя миниатюры: {"url", "width", "height"}}, заполняется задачей
+    avatar_renditions = models.JSONField(
+        "Миниатюры фотографии", default=dict, editable=False
     )
     birth_date = models.DateField("Дата рождения", blank=True, null=True)
 
@@ -87,7 +77,59 @@ class Follow(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} подписан на {self.author.username}"
+
+
+class UserStatsQuerySet(CounterQuerySetMixin, models.QuerySet):
+    """QuerySet счетчиков пользователей."""
+
+
+class UserStatsManager(models.Manager):
+    def get_queryset(self) -> models.QuerySet:
+        return UserStatsQuerySet(self.model, using=self._db)
+
+    def increment(self, field_name, amounts):
+        """Увеличивает счетчики пользователей."""
+        return self.get_queryset().increment(field_name, amounts)
+
+
+class UserStats(models.Model):
+    """
+    Модель счетчиков пользователя.
+    Обновляется в транзакции вместе с постами и подписками.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="пользователь",
+    )
+    posts_count = models.PositiveIntegerField("Кол-во постов", default=0)
+    subscribers_count = models.PositiveIntegerField(
+        "Кол-во подписчиков", default=0
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        "Кол-во подписок", default=0
+    )
+    views_count = models.PositiveIntegerField(
+        "Кол-во просмотров постов", default=0
+    )
+    # отмечает задача posts.tasks.update_pulled_authors
+    timeline_pulled = models.BooleanField(
+        "Посты подмешиваются в ленты при чтении", default=False
+    )
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+
+    def __str__(self):
+        return f"Статистика {self.user}"
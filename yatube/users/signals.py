@@ -0,0 +1,50 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from posts.images import needs_renditions
+from posts.tasks import generate_renditions
+
+from .models import Follow, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def user_created(instance, created, **kwargs):
+    """Новому пользователю создается запись статистики."""
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(instance, **kwargs):
+    """Для новой фотографии ставится в очередь создание миниатюр."""
+    if needs_renditions(instance.avatar):
+        transaction.on_commit(
+            partial(
+                generate_renditions.delay,
+                User._meta.label,
+                instance.pk,
+                "avatar",
+                instance.avatar.name,
+            )
+        )
+
+
+@receiver(post_save, sender=Follow)
+def follow_stats_created(instance, created, **kwargs):
+    """При подписке увеличиваются счетчики подписчика и автора."""
+    if created:
+        UserStats.objects.increment(
+            "subscriptions_count", {instance.user_id: 1}
+        )
+        UserStats.objects.increment(
+            "subscribers_count", {instance.author_id: 1}
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_stats_deleted(instance, **kwargs):
+    """При отписке уменьшаются счетчики подписчика и автора."""
+    UserStats.objects.increment("subscriptions_count", {instance.user_id: -1})
+    UserStats.objects.increment("subscribers_count", {instance.author_id: -1})
@@ -12,6 +12,7 @@ from django.views.generic import (
     UpdateView,
 )
 from posts.forms import FollowForm
+from posts.mixins import CacheMixin, KeysetPaginationMixin
 from posts.models import Post
 
 from .forms import ProfileEditForm, RegisterForm
@@ -76,7 +77,9 @@ class ProfileView(LoginRequiredMixin, DetailView):
         return context
 
 
-class ProfileDetailView(LoginRequiredMixin, ListView):
+class ProfileDetailView(
+    LoginRequiredMixin, CacheMixin, KeysetPaginationMixin, ListView
+):
     """
     Класс представления личной страницы пользователя
     с отображением ленты его опубликованных постов.
@@ -108,11 +111,17 @@ class ProfileDetailView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         username = self.kwargs.get("username")
         self.author = get_object_or_404(
-            User.objects.get_is_subscribed(),
+            User.objects.get_is_subscribed().select_related("stats"),
             username=username,
         )
         return self.author.posts.select_related("group")
 
+    def get_cache_name(self) -> str:
+        return f"profile_cache_{self.author.pk}"
+
+    def get_cache_namespaces(self):
+        return (f"author_{self.author.pk}",)
+
 
 class UserListView(ListView):
     """Класс представление списка всех пользователей."""
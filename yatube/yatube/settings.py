@@ -140,6 +140,34 @@ USE_TZ = True
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Миниатюры картинок, создаваемые в фоне сразу после загрузки:
+# "приложение.Модель.поле": {имя миниатюры: размер}.
+IMAGE_RENDITIONS = {
+    "posts.Post.image": {
+        "feed": "500x300",
+        "detail": "500x600",
+        "full": "800x800",
+    },
+    "users.User.avatar": {
+        "small": "50x50",
+        "medium": "256x256",
+        "large": "550x630",
+    },
+}
+
+# Длинная сторона хранимой картинки поста после конвертации в WEBP.
+IMAGE_MAX_EDGE = 2560
+# Картинки с большим числом пикселей отклоняются по заголовку файла,
+# до декодирования.
+IMAGE_MAX_PIXELS = 60_000_000
+# Наибольшее число пикселей, декодируемых при конвертации: JPEG
+# декодируется сразу уменьшенным (не больше чем вдвое больше
+# IMAGE_MAX_EDGE по каждой стороне), остальные форматы - целиком,
+# поэтому PNG, WEBP и GIF больше этого предела отклоняются.
+IMAGE_MAX_DECODE_PIXELS = 4 * IMAGE_MAX_EDGE**2
+# Наибольший размер картинки, загружаемой через API, в байтах.
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
 STATIC_URL = "/static/"
 
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
@@ -155,11 +183,60 @@ LOGIN_REDIRECT_URL = "posts:index"
 
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Общий кеш в Redis для всех воркеров; без REDIS_URL (разработка, тесты)
+# используется локальный кеш процесса.
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "yatube")
+CACHE_VERSION = int(os.getenv("CACHE_VERSION", 1))
+
+# Защита кеша лент от одновременной перестройки:
+# сколько секунд отдавать устаревшую страницу во время перестройки,
+# вероятностное досрочное обновление и фоновое обновление через Celery.
+CACHE_STALE_TIMEOUT = 60
+CACHE_EARLY_REFRESH = False
+CACHE_BACKGROUND_REFRESH = False
+# Сколько секунд хранятся страницы результатов поиска.
+SEARCH_CACHE_TIMEOUT = 60
+# Подсказки поиска: сколько результатов каждого типа возвращать,
+# предельное время запроса к БД в миллисекундах и срок кеша префикса.
+AUTOCOMPLETE_LIMIT = 5
+AUTOCOMPLETE_TIMEOUT = 50
+AUTOCOMPLETE_CACHE_TIMEOUT = 300
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "VERSION": CACHE_VERSION,
+            "OPTIONS": {
+                "serializer": "core.cache.CompressedRedisSerializer",
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "VERSION": CACHE_VERSION,
+        }
+    }
+
+# Скетчи уникальных просмотров (VIEWS_HLL) хранятся в отдельном Redis
+# с maxmemory-policy noeviction: вытеснение или очистка основного кеша
+# обнулили бы их. Без VIEWS_REDIS_URL скетчи хранятся в таблице
+# ViewSketch.
+VIEWS_REDIS_URL = os.getenv("VIEWS_REDIS_URL")
+if VIEWS_REDIS_URL:
+    CACHES["views"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": VIEWS_REDIS_URL,
+        "KEY_PREFIX": CACHE_KEY_PREFIX,
+        "TIMEOUT": None,
     }
-}
 
 REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
@@ -202,6 +279,72 @@ CELERY_TIMEZONE = "UTC"
 
 PAGE_SIZE = 8
 
+# Постраничный вывод лент по ключу (pub_date, id) вместо номеров страниц.
+KEYSET_PAGINATION = False
+
+# Авторы с большим числом подписчиков не рассылают посты по лентам,
+# их посты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Авторы переключаются между рассылкой и чтением напрямую задачей
+# update_pulled_authors раз в TIMELINE_PULLED_INTERVAL секунд.
+TIMELINE_PULLED_INTERVAL = 300
+# При подписке и при возврате автора к рассылке в ленты добавляются
+# все его посты, пачками по TIMELINE_BATCH_SIZE.
+TIMELINE_BATCH_SIZE = 1000
+
+# Просмотры постов копятся в буфере и записываются в БД пачками
+# задачей flush_post_views: по расписанию CELERY_BEAT_SCHEDULE
+# и досрочно, когда в буфере набирается VIEWS_BUFFER_SIZE просмотров.
+# Без REDIS_URL буфер хранится в памяти процесса сайта, и тот не реже
+# раза в VIEWS_FLUSH_INTERVAL секунд передает его просмотры задаче.
+VIEWS_BUFFER_SIZE = 1000
+VIEWS_FLUSH_INTERVAL = 10
+VIEWS_FLUSH_BATCH_SIZE = 1000
+# Уникальные просмотры постов и авторов по дням считаются скетчами
+# HyperLogLog (см. VIEWS_REDIS_URL), счетчики постов растут на прирост
+# оценки скетча; в ViewPost пишутся только просмотры пользователей,
+# а сводки по дням пополняются тем же приростом, с анонимными.
+VIEWS_HLL = False
+VIEWS_HLL_RETENTION_DAYS = 366
+
+# Сводка ViewPost в просмотры постов и авторов по дням.
+VIEWS_ROLLUP_INTERVAL = 300
+VIEWS_ROLLUP_BATCH_SIZE = 10000
+VIEWS_ROLLUP_LAG = 60
+# Статистика автора в API и график в админке: период по умолчанию,
+# наибольший период и число самых просматриваемых постов.
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+STATS_TOP_POSTS = 10
+
+# Просмотры ViewPost хранятся VIEWS_RETENTION_MONTHS месяцев
+# (None - бессрочно). Секционированная таблица (команда partition_views)
+# очищается удалением секций, при VIEWS_RETENTION_ARCHIVE секции только
+# отсоединяются для выгрузки в архив; иначе записи удаляются пачками.
+VIEWS_RETENTION_MONTHS = None
+VIEWS_RETENTION_ARCHIVE = False
+VIEWS_PARTITIONS_AHEAD = 3
+VIEWS_PRUNE_BATCH_SIZE = 5000
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-post-views": {
+        "task": "posts.tasks.flush_post_views",
+        "schedule": VIEWS_FLUSH_INTERVAL,
+    },
+    "rollup-post-views": {
+        "task": "posts.tasks.rollup_post_views",
+        "schedule": VIEWS_ROLLUP_INTERVAL,
+    },
+    "prune-post-views": {
+        "task": "posts.tasks.prune_post_views",
+        "schedule": 24 * 60 * 60,
+    },
+    "update-pulled-authors": {
+        "task": "posts.tasks.update_pulled_authors",
+        "schedule": TIMELINE_PULLED_INTERVAL,
+    },
+}
+
 MESSAGE_TAGS = {
     messages.DEBUG: "debug",
     messages.INFO: "info",